@@ -3,29 +3,30 @@
 import smbus
 import time
 
+ENCODER_RESOLUTION = 16384  # 14 bit angle, ticks per revolution
+
 class as5048b:
-    def __init__(self, expected_zero_angle, address):
-        self.bus = smbus.SMBus(1)
+    def __init__(self, expected_zero_angle, address, bus=None):
+        self.bus = bus if bus is not None else smbus.SMBus(1) # Any SMBus compatible object, e.g. a recording or simulated bus
         self.AS5048B_ADDR = address # AS5048B default address
         self.AS5048B_ANGLE_REG = 0xFE # AS5048B Register
         self.expected_zero_angle = expected_zero_angle
 
     def get_angle(self):
-        # Read data from the angle register
-        data = self.bus.read_i2c_block_data(self.AS5048B_ADDR, self.AS5048B_ANGLE_REG, 2)
-
-        # Convert the data
-        angle_pre_conversion = data[0] * 256 + data[1]
+        # Same 14 bit decode as get_raw_ticks, so the angle and the tick lookup tables agree
+        return self.corrected_angle(self.get_raw_ticks())
 
+    def corrected_angle(self, tick):
         # Full range of the sensor is 0 to 16383
-        # Convert to degrees (0 to 360)
-        measured_angle = (angle_pre_conversion / 16383.0) * 90.0
-        corrected_angle = (measured_angle - self.expected_zero_angle) % 360
+        # Convert to degrees (0 to 360) and remove the zero offset
+        return (tick * 360.0 / ENCODER_RESOLUTION - self.expected_zero_angle) % 360
 
-        # Adjust if negative due to negative offset
-        corrected_angle = corrected_angle if corrected_angle >= 0 else corrected_angle + 360
+    def get_raw_ticks(self):
+        # Read data from the angle register
+        data = self.bus.read_i2c_block_data(self.AS5048B_ADDR, self.AS5048B_ANGLE_REG, 2)
 
-        return corrected_angle
+        # 0xFE holds bits 13:6 and 0xFF holds bits 5:0 of the 14 bit angle (0 to 16383)
+        return (data[0] << 6) | (data[1] & 0x3F)
 
  # Example run
 """ def main():
@@ -0,0 +1,104 @@
+# Purpose: Shared attitude math for the gimbal ring encoders, used by the ADS scripts.
+
+import numpy as np  # Import numpy for table construction and matrix manipulation.
+
+ENCODER_RESOLUTION = 16384  # 14 bit AS5048B, ticks per revolution
+
+
+class EncoderTrigTable:
+    """
+    Precomputed cosine and sine of every encoder tick for one encoder.
+
+    The encoder's zero offset is folded into the table, so a raw tick indexes
+    straight into cos/sin of the corrected angle with no transcendental calls.
+    """
+
+    def __init__(self, zero_offset=0.0, resolution=ENCODER_RESOLUTION):
+        # Corrected angle of every tick in radians (zero offset is in degrees, like as5048b).
+        angles = np.radians(np.arange(resolution) * (360.0 / resolution) - zero_offset)
+
+        # Interleaved table, row = tick, columns = (cos, sin). Used for array lookups.
+        self.table = np.column_stack((np.cos(angles), np.sin(angles)))
+
+        # The same table as Python float pairs. Scalar lookups return these directly
+        # instead of creating new numpy scalars every loop.
+        self.pairs = [tuple(row) for row in self.table.tolist()]
+
+        self.mask = resolution - 1  # Resolution is a power of two, masking wraps the tick
+
+    def lookup(self, tick):
+        # (cos, sin) of the corrected angle for one raw tick.
+        return self.pairs[tick & self.mask]
+
+    def lookup_batch(self, ticks):
+        # (N, 2) array of (cos, sin) for an array of raw ticks.
+        return self.table[np.asarray(ticks) & self.mask]
+
+
+def zxz_dcm(cos_phi, sin_phi, cos_theta, sin_theta, cos_psi, sin_psi):
+    # Closed form of R_3(psi) @ R_1(theta) @ R_3(phi), the inertial to body DCM used by
+    # main_3_dof_att_det, written out so it costs only multiplies and adds.
+    return np.array([
+        [cos_psi * cos_phi - sin_psi * cos_theta * sin_phi,
+         -cos_psi * sin_phi - sin_psi * cos_theta * cos_phi,
+         sin_psi * sin_theta],
+        [sin_psi * cos_phi + cos_psi * cos_theta * sin_phi,
+         -sin_psi * sin_phi + cos_psi * cos_theta * cos_phi,
+         -cos_psi * sin_theta],
+        [sin_theta * sin_phi,
+         sin_theta * cos_phi,
+         cos_theta],
+    ])
+
+
+def dcm_from_ticks(phi_tick, theta_tick, psi_tick, tables):
+    # Inertial to body DCM straight from raw encoder ticks, tables = (phi, theta, psi) EncoderTrigTables.
+    cos_phi, sin_phi = tables[0].lookup(phi_tick)
+    cos_theta, sin_theta = tables[1].lookup(theta_tick)
+    cos_psi, sin_psi = tables[2].lookup(psi_tick)
+    return zxz_dcm(cos_phi, sin_phi, cos_theta, sin_theta, cos_psi, sin_psi)
+
+
+def body_axes_inertial_from_ticks(phi_tick, theta_tick, psi_tick, tables):
+    # Body axes in inertial coordinates are the columns of the body to inertial DCM,
+    # which are the rows of the inertial to body DCM, so no transpose or products are needed.
+    inertial_to_body_DCM = dcm_from_ticks(phi_tick, theta_tick, psi_tick, tables)
+    return [inertial_to_body_DCM[0], inertial_to_body_DCM[1], inertial_to_body_DCM[2]]
+
+
+def zxz_dcm_batch(phi, theta, psi, degrees=True):
+    # Vectorized R_3(psi) @ R_1(theta) @ R_3(phi) for whole arrays of gimbal angles.
+    # Returns an (..., 3, 3) array, one inertial to body DCM per sample, built from the
+    # closed form entries with broadcasting instead of per-sample matrix products.
+    phi, theta, psi = np.broadcast_arrays(np.asarray(phi, dtype=float), np.asarray(theta, dtype=float), np.asarray(psi, dtype=float))
+    if degrees:
+        phi, theta, psi = np.radians(phi), np.radians(theta), np.radians(psi)
+
+    cos_phi, sin_phi = np.cos(phi), np.sin(phi)
+    cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+    cos_psi, sin_psi = np.cos(psi), np.sin(psi)
+
+    dcm = np.empty(phi.shape + (3, 3))
+    dcm[..., 0, 0] = cos_psi * cos_phi - sin_psi * cos_theta * sin_phi
+    dcm[..., 0, 1] = -cos_psi * sin_phi - sin_psi * cos_theta * cos_phi
+    dcm[..., 0, 2] = sin_psi * sin_theta
+    dcm[..., 1, 0] = sin_psi * cos_phi + cos_psi * cos_theta * sin_phi
+    dcm[..., 1, 1] = -sin_psi * sin_phi + cos_psi * cos_theta * cos_phi
+    dcm[..., 1, 2] = -cos_psi * sin_theta
+    dcm[..., 2, 0] = sin_theta * sin_phi
+    dcm[..., 2, 1] = sin_theta * cos_phi
+    dcm[..., 2, 2] = cos_theta
+    return dcm
+
+
+def body_axes_inertial_batch(phi, theta, psi):
+    # Batch version of get_body_axes_inertial in main_3_dof_att_det, angles in degrees.
+    # Returns an (N, 3, 3) array where [n, 0], [n, 1] and [n, 2] are the body X, Y and Z
+    # axes in inertial coordinates for sample n (the rows of the inertial to body DCM).
+    return zxz_dcm_batch(phi, theta, psi, degrees=True)
+
+
+def rotate_points_batch(points, dcm):
+    # Rotate a fixed set of points (M, 3) by every DCM in an (N, 3, 3) stack, returning
+    # (N, M, 3). Same as np.dot(points, dcm.T) for each frame, done in one einsum.
+    return np.einsum('mj,nij->nmi', points, dcm)
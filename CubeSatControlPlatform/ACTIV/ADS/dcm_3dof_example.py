@@ -3,6 +3,7 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 from matplotlib import rc
+from attitude import zxz_dcm_batch, rotate_points_batch
 
 def euler_to_dcm(phi, theta, psi):
     # Rotation matrix for phi about Z-axis
@@ -24,6 +25,11 @@ def euler_to_dcm(phi, theta, psi):
     dcm = R3 @ R2 @ R1
     return dcm
 
+def euler_to_dcm_batch(phi, theta, psi):
+    # Same rotations as euler_to_dcm for whole angle arrays at once. These matrices rotate
+    # the frame rather than the vector, which is the Z-X-Z product with negated angles.
+    return zxz_dcm_batch(-phi, -theta, -psi, degrees=False)
+
 # Example encoder angle data (in radians)
 phi = np.linspace(0, 2*np.pi, 100)  # Simulated angle data
 theta = np.sin(phi / -2 / np.pi) * 2 * np.pi
@@ -65,15 +71,19 @@ axes = np.array([[2, 0, 0],  # x-axis
                  [0, 2, 0],  # y-axis
                  [0, 0, 2]]) # z-axis
 
+# Precompute every animation frame at once instead of building the DCM inside animate()
+dcm_frames = euler_to_dcm_batch(phi, theta, psi)
+rotated_vertices_frames = rotate_points_batch(vertices, dcm_frames)
+rotated_axes_frames = rotate_points_batch(axes, dcm_frames)
+
 # Set the font to Times New Roman
 rc('font', family='serif')
 rc('font', serif='Times New Roman')
 
 def animate(i):
     ax.clear()
-    dcm = euler_to_dcm(phi[i], theta[i], psi[i])
-    rotated_vertices = np.dot(vertices, dcm.T)
-    rotated_axes = np.dot(axes, dcm.T)
+    rotated_vertices = rotated_vertices_frames[i]
+    rotated_axes = rotated_axes_frames[i]
 
     # Draw the cube
     poly = Poly3DCollection([rotated_vertices[[0, 1, 2, 3]], 
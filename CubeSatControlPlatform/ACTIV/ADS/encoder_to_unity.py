@@ -6,9 +6,9 @@ import socket
 host, port = "192.168.1.12", 25001
 
 # Create instances of as5048b class
-encoder_local_z1 = as5048b(282.78, address=0x41)  # Encoder for the first local Z-axis (yaw)
+encoder_local_z1 = as5048b(283.07, address=0x41)  # Encoder for the first local Z-axis (yaw)
 
-encoder_local_x = as5048b(66.42, address=0x40)   # Encoder for local X-axis (roll)
+encoder_local_x = as5048b(67.39, address=0x40)   # Encoder for local X-axis (roll)
 
 encoder_local_z2 = as5048b(0, address=0x42)  # Encoder for the second local Z-axis (yaw)
 print("Encoder objects instantiated")
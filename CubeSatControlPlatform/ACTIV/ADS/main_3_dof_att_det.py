@@ -1,6 +1,11 @@
 from as5048b import as5048b  # Import the as5048b module for handling AS5048B magnetic rotary position sensor.
 import numpy as np           # Import numpy for mathematical operations and matrix manipulation.
 import time                  # Import time module to use sleep for timing control.
+from attitude import EncoderTrigTable, body_axes_inertial_from_ticks  # Precomputed sin/cos per encoder tick.
+from quaternion import quat_from_gimbal, quat_to_dcm  # Quaternion attitude, same layout as the Madgwick filter output.
+
+use_trig_cache = True  # Build the DCM from raw encoder ticks with lookup tables instead of np.cos/np.sin.
+use_quaternion = False  # Represent the attitude as a quaternion instead of multiplying three rotation matrices.
 
 def get_body_axes_inertial(phi, theta, psi):
     # Convert angles from degrees to radians for mathematical operations.
@@ -41,27 +46,52 @@ def get_body_axes_inertial(phi, theta, psi):
 
 def main():
     # Initialize encoder instances for local Z1, X, and Z2 axes. These will read angular positions.
-    encoder_local_z1 = as5048b(282.78, address=0x41)  # Encoder for the first local Z-axis (yaw)
+    encoder_local_z1 = as5048b(283.07, address=0x41)  # Encoder for the first local Z-axis (yaw)
 
-    encoder_local_x = as5048b(66.42, address=0x40)   # Encoder for local X-axis (roll)
+    encoder_local_x = as5048b(67.39, address=0x40)   # Encoder for local X-axis (roll)
 
     encoder_local_z2 = as5048b(0, address=0x42)  # Encoder for the second local Z-axis (yaw)
 
+    encoders = (encoder_local_z1, encoder_local_x, encoder_local_z2)
+
+    if use_trig_cache:
+        # One cos/sin table per encoder with its zero offset folded in.
+        trig_tables = [EncoderTrigTable(encoder.expected_zero_angle) for encoder in encoders]
+
     report_interval = 1  # How many loops to wait before reporting again.
     loop_counter = 0  # Counter to keep track of loop iterations.
 
     while(True):
-        # Continuously read the angular positions from all three encoders.
-        phi = encoder_local_z1.get_angle()  # Angle around the first Z-axis (yaw) in degrees.
-        theta = encoder_local_x.get_angle()      # Angle around the X-axis (roll) in degrees.
-        psi = encoder_local_z2.get_angle()  # Angle around the second Z-axis (yaw) in degrees.
-
-        # Calculate the body frame axes with respect to the inertial frame based on encoder readings.
-        body_axes_inertial = get_body_axes_inertial(phi, theta, psi)
+        if use_quaternion:
+            # Read the gimbal angles and convert them straight to a quaternion, no matrix products.
+            phi = encoder_local_z1.get_angle()  # Angle around the first Z-axis (yaw) in degrees.
+            theta = encoder_local_x.get_angle()      # Angle around the X-axis (roll) in degrees.
+            psi = encoder_local_z2.get_angle()  # Angle around the second Z-axis (yaw) in degrees.
+            attitude_quaternion = quat_from_gimbal(phi, theta, psi)
+
+            # Rows of the inertial to body DCM are the body axes in inertial coordinates.
+            body_axes_inertial = list(quat_to_dcm(attitude_quaternion))
+        elif use_trig_cache:
+            # Read raw ticks from all three encoders and build the body axes from table lookups.
+            ticks = [encoder.get_raw_ticks() for encoder in encoders]
+            body_axes_inertial = body_axes_inertial_from_ticks(*ticks, trig_tables)
+
+            # Corrected angles in degrees for reporting, no extra encoder reads needed.
+            phi, theta, psi = [encoder.corrected_angle(tick) for tick, encoder in zip(ticks, encoders)]
+        else:
+            # Continuously read the angular positions from all three encoders.
+            phi = encoder_local_z1.get_angle()  # Angle around the first Z-axis (yaw) in degrees.
+            theta = encoder_local_x.get_angle()      # Angle around the X-axis (roll) in degrees.
+            psi = encoder_local_z2.get_angle()  # Angle around the second Z-axis (yaw) in degrees.
+
+            # Calculate the body frame axes with respect to the inertial frame based on encoder readings.
+            body_axes_inertial = get_body_axes_inertial(phi, theta, psi)
 
         if loop_counter % report_interval == 0:
             #print(f"Body Axes Inertial Orientation: X-axis: {body_axes_inertial[0]}, Y-axis: {body_axes_inertial[1]}, Z-axis: {body_axes_inertial[2]}")
             print(f"First Z (Yaw): {phi:.2f} deg, X (Roll): {theta:.2f} deg, Second Z (Yaw): {psi:.2f} deg\n")
+            if use_quaternion:
+                print(f"Attitude quaternion [w, x, y, z]: {np.round(attitude_quaternion, 4)}\n")
             #print(f"Body Axes Inertial Orientation: X-axis: {[f'{x:.2f}' for x in body_axes_inertial[0]]}, Y-axis: {[f'{y:.2f}' for y in body_axes_inertial[1]]}, Z-axis: {[f'{z:.2f}' for z in body_axes_inertial[2]]}")
 
         
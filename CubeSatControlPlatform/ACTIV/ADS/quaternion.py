@@ -0,0 +1,128 @@
+# Purpose: Quaternion attitude representation for the 3 ring gimbal.
+# Quaternions are stored scalar first, [w, x, y, z], the same layout the Madgwick filter
+# (ahrs) outputs, so encoder and IMU attitudes share one type. Every function works on a
+# single quaternion of shape (4,) or on a batch of shape (..., 4).
+
+import numpy as np  # Import numpy for vectorized math.
+
+
+def quat_from_gimbal(phi, theta, psi, degrees=True):
+    # Quaternion of R_3(psi) @ R_1(theta) @ R_3(phi), the same rotation as the inertial to body
+    # DCM in main_3_dof_att_det. The product q_z(psi) * q_x(theta) * q_z(phi) collapses to
+    # half angle sums and differences, so no matrices or quaternion products are needed.
+    phi, theta, psi = np.broadcast_arrays(np.asarray(phi, dtype=float), np.asarray(theta, dtype=float), np.asarray(psi, dtype=float))
+    if degrees:
+        phi, theta, psi = np.radians(phi), np.radians(theta), np.radians(psi)
+
+    half_sum = 0.5 * (psi + phi)
+    half_diff = 0.5 * (psi - phi)
+    cos_half_theta = np.cos(0.5 * theta)
+    sin_half_theta = np.sin(0.5 * theta)
+
+    q = np.empty(phi.shape + (4,))
+    q[..., 0] = cos_half_theta * np.cos(half_sum)
+    q[..., 1] = sin_half_theta * np.cos(half_diff)
+    q[..., 2] = sin_half_theta * np.sin(half_diff)
+    q[..., 3] = cos_half_theta * np.sin(half_sum)
+    return q
+
+
+def quat_to_gimbal(q, degrees=True):
+    # Inverse of quat_from_gimbal, returns (phi, theta, psi). The half angle sum and
+    # difference come from separate atan2 calls, so this stays well conditioned near
+    # theta = 0 where the two Z rotations line up. At exactly theta = 0 only phi + psi is
+    # observable and it is split evenly between phi and psi.
+    q = np.asarray(q, dtype=float)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+    theta = 2.0 * np.arctan2(np.hypot(x, y), np.hypot(w, z))
+    half_sum = np.arctan2(z, w)
+    half_diff = np.arctan2(y, x)
+    phi = half_sum - half_diff
+    psi = half_sum + half_diff
+
+    if degrees:
+        return np.degrees(phi), np.degrees(theta), np.degrees(psi)
+    return phi, theta, psi
+
+
+def quat_multiply(q, r):
+    # Hamilton product q * r, applying r first and then q.
+    q = np.asarray(q, dtype=float)
+    r = np.asarray(r, dtype=float)
+    w1, x1, y1, z1 = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    w2, x2, y2, z2 = r[..., 0], r[..., 1], r[..., 2], r[..., 3]
+    return np.stack((
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+        w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+    ), axis=-1)
+
+
+def quat_conjugate(q):
+    # Inverse rotation of a unit quaternion.
+    q = np.array(q, dtype=float)
+    q[..., 1:] *= -1.0
+    return q
+
+
+def quat_normalize(q):
+    # Rescale to unit length, removes drift after repeated products or integration.
+    q = np.asarray(q, dtype=float)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def quat_to_dcm(q):
+    # Rotation matrix of a unit quaternion, (..., 4) -> (..., 3, 3). For a quaternion from
+    # quat_from_gimbal this is the inertial to body DCM, its rows are the body axes.
+    q = np.asarray(q, dtype=float)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+    dcm = np.empty(q.shape[:-1] + (3, 3))
+    dcm[..., 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    dcm[..., 0, 1] = 2.0 * (x * y - w * z)
+    dcm[..., 0, 2] = 2.0 * (x * z + w * y)
+    dcm[..., 1, 0] = 2.0 * (x * y + w * z)
+    dcm[..., 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    dcm[..., 1, 2] = 2.0 * (y * z - w * x)
+    dcm[..., 2, 0] = 2.0 * (x * z - w * y)
+    dcm[..., 2, 1] = 2.0 * (y * z + w * x)
+    dcm[..., 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return dcm
+
+
+def dcm_to_quat(dcm):
+    # Unit quaternion of a rotation matrix, (..., 3, 3) -> (..., 4), with w >= 0.
+    # Each sample is solved from its largest diagonal term (Shepperd's method) so the
+    # square root never works on a near-zero value.
+    dcm = np.asarray(dcm, dtype=float)
+    m00, m01, m02 = dcm[..., 0, 0], dcm[..., 0, 1], dcm[..., 0, 2]
+    m10, m11, m12 = dcm[..., 1, 0], dcm[..., 1, 1], dcm[..., 1, 2]
+    m20, m21, m22 = dcm[..., 2, 0], dcm[..., 2, 1], dcm[..., 2, 2]
+
+    # Candidate solutions, one per choice of pivot, each scaled by 4 times its pivot component
+    candidates = np.stack((
+        np.stack((1.0 + m00 + m11 + m22, m21 - m12, m02 - m20, m10 - m01), axis=-1),
+        np.stack((m21 - m12, 1.0 + m00 - m11 - m22, m01 + m10, m02 + m20), axis=-1),
+        np.stack((m02 - m20, m01 + m10, 1.0 - m00 + m11 - m22, m12 + m21), axis=-1),
+        np.stack((m10 - m01, m02 + m20, m12 + m21, 1.0 - m00 - m11 + m22), axis=-1),
+    ), axis=-2)
+    pivots = np.stack((m00 + m11 + m22, m00, m11, m22), axis=-1)
+    best = np.argmax(pivots, axis=-1)
+
+    q = np.take_along_axis(candidates, best[..., None, None], axis=-2)[..., 0, :]
+    q = quat_normalize(q)
+    return np.where(q[..., :1] < 0.0, -q, q)
+
+
+def quat_to_roll_pitch_yaw(q):
+    # Roll (x), pitch (y) and yaw (z) in radians, the convention printed by
+    # EulerAngleAcquisitionMadgwick.py, for one quaternion or a whole batch.
+    q = np.asarray(q, dtype=float)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+    roll_x = np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y))
+    pitch_y = np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0))
+    yaw_z = np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))
+    return roll_x, pitch_y, yaw_z
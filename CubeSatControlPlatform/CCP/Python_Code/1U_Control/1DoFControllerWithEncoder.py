@@ -7,6 +7,7 @@ import time
 import struct
 from as5048b import as5048b
 from motor_controller import motor_controller
+from CanDispatcher import open_odrive_bus
 
 # Define a shared variable or event that threads can check
 running = threading.Event()
@@ -18,22 +19,9 @@ running.set()  # Set it to true initially
 
 #CAN initialization
 node_id = 0
-bus = can.interface.Bus("can0", bustype="socketcan")
-
-while not (bus.recv(timeout=0) is None): pass
-bus.send(can.Message(arbitration_id=(node_id << 5 | 0x07), data=struct.pack('<I', 8), is_extended_id=False))
-start_time = time.time()
-timeout = 10  # seconds
-
-for msg in bus:
-    if time.time() - start_time > timeout:
-        print("Timeout waiting for the expected CAN message.")
-        break
-
-    if msg.arbitration_id == (node_id << 5 | 0x01):
-        error, state, result, traj_done = struct.unpack('<IBBB', bytes(msg.data[:7]))
-        if state == 8:
-            break
+#Every received frame goes through the dispatcher, threads subscribe to the IDs they need and
+#only those IDs pass the kernel CAN filters
+bus, dispatcher = open_odrive_bus("can0", [node_id])
 
 #---------------------------------------------------------------------------------------
 #Attitude Determination Setup
@@ -74,13 +62,20 @@ while (time_remaining != 0):
     time.sleep(1)
 
 #Defining threads
-read_angle_thread = threading.Thread(target=encoder.read_angle, args=(running, ))
-set_motor_torque_thread = threading.Thread(target=pid.set_torque, args=(encoder, node_id, bus, running))
+fused_loop = False  # True: read encoder, compute PID and send torque in one thread each tick
+if fused_loop:
+    control_thread = threading.Thread(target=pid.control_loop, args=(encoder, node_id, bus, running))
+else:
+    read_angle_thread = threading.Thread(target=encoder.read_angle, args=(running, ))
+    set_motor_torque_thread = threading.Thread(target=pid.set_torque, args=(encoder, node_id, bus, running))
 
 #Initiate threads
 print("\nPID Active")
-read_angle_thread.start()
-set_motor_torque_thread.start()
+if fused_loop:
+    control_thread.start()
+else:
+    read_angle_thread.start()
+    set_motor_torque_thread.start()
 
 #---------------------------------------------------------------------------------------
 #Controller Shutdown
@@ -99,12 +94,20 @@ except KeyboardInterrupt:
 
 finally:
     # Wait for the threads to stop
-    read_angle_thread.join()
-    set_motor_torque_thread.join()
+    if fused_loop:
+        control_thread.join()
+    else:
+        read_angle_thread.join()
+        set_motor_torque_thread.join()
+    if pid.loop is not None:
+        print(pid.loop.report("control_loop" if fused_loop else "set_torque"))
+    if pid.latency.count:
+        print(pid.latency.report("encoder to bus.send latency"))
 
     bus.send(can.Message(arbitration_id=(node_id << 5 | 0x0E), data=struct.pack('<f', 0.0), is_extended_id=False))
     print(f"Successfully set ODrive {node_id} to 0 [Nm]")
 
     # Shutdown the bus in the finally block to ensure it's always executed
+    dispatcher.shutdown()
     bus.shutdown()
     print("\nProgram terminated gracefully.")
\ No newline at end of file
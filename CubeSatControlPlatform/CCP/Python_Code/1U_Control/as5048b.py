@@ -5,11 +5,13 @@ import smbus
 import time
 
 class as5048b:
-    def __init__(self):
+    def __init__(self, bus=None):
         """
         Initialize as5048b object
+
+        bus: SMBus compatible object to read from (e.g. a recording or simulated bus), defaults to SMBus(1)
         """
-        self.bus = smbus.SMBus(1)
+        self.bus = bus if bus is not None else smbus.SMBus(1)
         self.AS5048B_ADDR = 0x40 # AS5048B default address
         self.AS5048B_ANGLE_REG = 0xFE # AS5048B Register
         self.angle = 0 #Sensor angle
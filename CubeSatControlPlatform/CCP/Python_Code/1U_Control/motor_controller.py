@@ -1,8 +1,9 @@
-from simple_pid import PID
-import struct
+from FastPID import FastPID
 import time
 import can
 from as5048b import as5048b
+from PeriodicLoop import PeriodicLoop, LatencyRecorder
+from odrive_can import ODriveNode
 
 class motor_controller:
     def __init__(self, p, i, d, setpoint, lower_limit, upper_limit):
@@ -12,21 +13,43 @@ class motor_controller:
         self.d_parameter = d
 
         #Setup PID controller
-        self.pid = PID(p, i, d, setpoint)
-        self.pid.output_limits = (lower_limit, upper_limit)
+        self.pid = FastPID(p, i, d, setpoint, output_limits=(lower_limit, upper_limit))
+
+        #Control loop rate [s] and timing statistics
+        self.control_period = 0.001
+        self.control_spin_time = 0.0002  # Busy-wait before each control deadline
+        self.loop = None
+
+        #Encoder read to bus.send latency of the fused control loop
+        self.latency = LatencyRecorder()
 
     # Function to set torque for a specific O-Drive
     def set_torque(self, encoder_obj, node_id, bus, running):
+        loop = self.loop = PeriodicLoop(self.control_period, spin_time=self.control_spin_time)
+        odrive = ODriveNode(node_id)  # Reused transmit frame of this thread
         while running.is_set():
-            torque = self.pid(encoder_obj.angle)
+            torque = self.pid(encoder_obj.angle, self.control_period)
 
             if encoder_obj.angle < 5:
                 torque = 0
                 
-            bus.send(can.Message(
-                arbitration_id=(node_id << 5 | 0x0E),  # 0x0E: Set_Input_Torque
-                data=struct.pack('<f', torque),
-                is_extended_id=False
-            ))
+            bus.send(odrive.torque(torque))
             #print(f"Successfully set ODrive {node_id} to {torque} [Nm]")
-            time.sleep(0.001)
+            loop.wait()
+
+    # Fused sense-compute-actuate loop: reads the encoder, updates the PID and sends the torque back-to-back each tick
+    def control_loop(self, encoder_obj, node_id, bus, running):
+        loop = self.loop = PeriodicLoop(self.control_period, spin_time=self.control_spin_time)
+        odrive = ODriveNode(node_id)
+        while running.is_set():
+            #Timestamp before the read so the recorded latency includes the I2C transfer
+            sample_time = time.monotonic()
+            angle = encoder_obj.read_angle()
+            torque = self.pid.update(angle, sample_time)
+
+            if angle < 5:
+                torque = 0
+
+            bus.send(odrive.torque(torque))
+            self.latency.record(time.monotonic() - sample_time)
+            loop.wait()
@@ -1,10 +1,9 @@
 import smbus
 import time
-from simple_pid import PID
+from FastPID import FastPID
 import pyodrivecan
 import asyncio
 import math
-from advanced_pid import PID
 from advanced_pid.models import MassSpringDamper
 from matplotlib import pyplot as plt
 from numpy import diff
@@ -27,7 +26,7 @@ def read_raw_angle():
 # Function to convert raw angle to degrees
 def raw_to_degrees(raw_angle):
     degrees = ((raw_angle / 16383.0) * 360) / 8
-    return round((degrees + 90) % 360, 2)
+    return (degrees + 90) % 360
 
 # Initialize the last angle, total rotations, and rest position
 last_angle_raw = read_raw_angle()
@@ -105,8 +104,7 @@ async def main():
         odrive.set_controller_mode("velocity_control")
 
         # Set up PID controller with setpoint at 180 degrees
-        pid = PID(10, 5, 0.05, setpoint=180)
-        pid.output_limits = (-1000, 1000)  # Example PID limits for control
+        pid = FastPID(10, 5, 0.05, setpoint=180, output_limits=(-1000, 1000))  # Example PID limits for control
 
         use_pid = False
 
@@ -124,7 +122,7 @@ async def main():
                     await controller(odrive, trial_id)  # Continue with controller function
             else:
                 # Perform PID control to maintain the angle at 180 degrees
-                control_output = pid(angle)
+                control_output = pid(angle, reading_interval)
                 print(f"PID control output: {control_output}")
 
                 # Set the velocity of the ODrive based on the PID control output
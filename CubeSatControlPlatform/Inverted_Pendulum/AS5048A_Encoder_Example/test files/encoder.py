@@ -19,7 +19,7 @@ def read_raw_angle():
 def raw_to_degrees(raw_angle):
     # Adjust raw angle to make +x (right direction) as 0 degrees
     degrees = ((raw_angle / 16383.0) * 360)/8
-    return round((degrees + 90) % 360, 2)  # Shift by 90 degrees, ensure wrap around, and round to 2 decimal places
+    return (degrees + 90) % 360  # Shift by 90 degrees and ensure wrap around
 
 # Initialize the last angle, total rotations, and rest position
 last_angle_raw = read_raw_angle()
@@ -20,7 +20,7 @@ def read_raw_angle():
 # Function to convert raw angle to degrees
 def raw_to_degrees(raw_angle):
     degrees = ((raw_angle / 16383.0) * 360)/8 - 152.750
-    return round((degrees + 90) % 360, 2)  # Shift by 90 degrees, ensure wrap around, and round to 2 decimal places
+    return (degrees + 90) % 360  # Shift by 90 degrees and ensure wrap around
 
 # Initialize variables
 duration = 60  # Duration of data collection in seconds
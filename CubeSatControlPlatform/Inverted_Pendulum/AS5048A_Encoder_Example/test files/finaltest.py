@@ -2,6 +2,7 @@ import smbus
 import time
 import pyodrivecan
 import asyncio
+from FastPID import FastPID
 
 # Initialize SMBus for I2C communication
 bus = smbus.SMBus(1)
@@ -18,7 +19,7 @@ def read_raw_angle():
 # Function to convert raw angle to degrees
 def raw_to_degrees(raw_angle):
     degrees = ((raw_angle / 16383.0) * 360) / 8
-    return round((degrees + 90) % 360, 2)  # Adjust to make +x (right direction) as 0 degrees
+    return (degrees + 90) % 360  # Adjust to make +x (right direction) as 0 degrees
 
 # Initialize encoder variables
 last_angle_raw = read_raw_angle()
@@ -33,7 +34,7 @@ stable_count_threshold = stable_duration / reading_interval
 # PID control variables
 kp = 0.1  # Proportional gain
 ki = 0.01  # Integral gain
-integral = 0  # Integral accumulator
+pid = FastPID(kp, ki, 0, setpoint=0)  # Target is 0 degrees
 
 def read_angle():
     global last_angle_raw, total_rotations, rest_position, stable_count
@@ -73,18 +74,8 @@ def read_angle():
     return total_angle
 
 def compute_pid_control(angle):
-    global integral
-
-    # Calculate error
-    error = 0 - angle  # Target is 0 degrees, so error is negative of current angle
-    
-    # Update integral
-    integral += error * reading_interval
-    
-    # Calculate control output
-    control_output = kp * error + ki * integral
-    
-    return control_output
+    # One reading interval between samples
+    return pid(angle, reading_interval)
 
 async def main():
     # Initialize ODrive
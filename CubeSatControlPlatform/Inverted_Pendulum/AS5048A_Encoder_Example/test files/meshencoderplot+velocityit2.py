@@ -3,6 +3,7 @@ import time
 import pyodrivecan
 import asyncio
 import math
+from FastPID import FastPID
 
 # Initialize SMBus for I2C communication
 bus = smbus.SMBus(1)
@@ -19,7 +20,7 @@ def read_raw_angle():
 # Function to convert raw angle to degrees
 def raw_to_degrees(raw_angle):
     degrees = ((raw_angle / 16383.0) * 360) / 8
-    return round((degrees + 90) % 360, 2)
+    return (degrees + 90) % 360
 
 # Initialize encoder variables
 last_angle_raw = read_raw_angle()
@@ -114,8 +115,8 @@ async def pid_control_oscillation(odrive, max_target_position=180, kp=0.1, ki=0.
     """
     Enhanced PID-based oscillation control with damping after initial dynamics.
     """
-    integral = 0
-    previous_error = 0
+    # Derivative on the angle rather than the error, so target changes do not kick the output
+    pid = FastPID(kp, ki, kd)
 
     try:
         # Initialize oscillation parameters
@@ -127,6 +128,7 @@ async def pid_control_oscillation(odrive, max_target_position=180, kp=0.1, ki=0.
         while True:
             # Set the target positions based on the current amplitude
             target_position = current_amplitude if direction > 0 else (360 - current_amplitude)
+            pid.setpoint = target_position
             print(f"Current Target Position: {target_position:.2f} degrees")
 
             # Oscillate to target position and build momentum
@@ -136,17 +138,11 @@ async def pid_control_oscillation(odrive, max_target_position=180, kp=0.1, ki=0.
                 angle = read_angle()
                 print(f"Current Angle: {angle:.2f} degrees")
 
-                # Calculate PID error terms
-                error = target_position - angle
-                integral += error * reading_interval
-                derivative = (error - previous_error) / reading_interval
-                previous_error = error
-
                 # Get current velocity asynchronously
                 current_velocity = await odrive.get_velocity()  # Await the coroutine
 
                 # PID control output with damping
-                velocity_command = kp * error + ki * integral + kd * derivative - damping * current_velocity
+                velocity_command = pid(angle, reading_interval) - damping * current_velocity
                 velocity_command = max(min(velocity_command, max_velocity), -max_velocity)  # Constrain velocity
                 odrive.set_velocity(velocity_command)
 
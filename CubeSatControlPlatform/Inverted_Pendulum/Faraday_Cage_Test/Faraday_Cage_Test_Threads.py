@@ -1,52 +1,97 @@
 #Purpose: define threads needed to operate inverted pendulum
 
-from simple_pid import PID
-import struct
 import time
 import can
 import sqlite3
+from PeriodicLoop import PeriodicLoop
+from CanDispatcher import GET_ENCODER_ESTIMATES
+from odrive_can import open_actuator, decode, SET_INPUT_VEL
+from SetpointPublisher import SetpointPublisher, StepSchedule
 
 class Faraday_Cage_Test_Threads:
     def __init__(self):
         self.encoder_position = 0
         self.encoder_velocity = 0
 
+        #IMU samples skipped by the logger, from StateSnapshot.seq
+        self.logger_missed_samples = 0
+
+        #Loop rates [s] and timing statistics of each thread
+        self.setpoint_period = 0.001
+        self.imu_period = 0.001
+        self.logger_period = 0.001
+        self.loops = {}
+
+        #True: the kernel repeats the velocity setpoint every setpoint_period (odrive_can.PeriodicActuator)
+        self.kernel_keepalive = False
+
+        #Velocity profile after the initial velocity: (time [s], velocity [turns/s])
+        self.velocity_steps = [(5, 5.0), (10, 10.0)]
+
+        #Setpoints are sent on a change larger than the deadband, or every keepalive_period [s]
+        self.setpoint_deadband = 0.0
+        self.keepalive_period = 0.1
+        self.publishers = {}
+
     #Thread to set motor velocity, CHANGE TO TORQUE CONTROL
     def set_vel_thread(self, node_id, bus, velocity, initialTime, running):
-        while running.is_set():
-            if (time.time() - initialTime) >= 5 and (time.time() - initialTime) < 10:
-                velocity = 5
-            if (time.time() - initialTime) >= 10:
-                velocity = 10
-            bus.send(can.Message(arbitration_id=(node_id << 5 | 0x0d), data=struct.pack('<ff', float(velocity), 0.0), is_extended_id=False))
-            time.sleep(0.001)
+        loop = self.loops['set_vel_thread'] = PeriodicLoop(self.setpoint_period)
+        actuator = open_actuator(bus, node_id, SET_INPUT_VEL, self.setpoint_period, self.kernel_keepalive)
+        schedule = StepSchedule(self.velocity_steps, before=float(velocity))
+        publisher = self.publishers['set_vel_thread'] = SetpointPublisher(actuator, self.setpoint_deadband, self.keepalive_period)
+        try:
+            while running.is_set():
+                publisher.publish(schedule(time.time() - initialTime), 0.0)
+                loop.wait()
+        finally:
+            actuator.stop()
 
     #Thread to read in orientation angle from IMU
     def read_angle_thread(self, imu_obj, running):
+        #In FIFO mode, drain all samples queued in the IMU FIFO each time it is about half full
+        loop = self.loops['read_angle_thread'] = PeriodicLoop(imu_obj.poll_interval if imu_obj.fifo_mode else self.imu_period)
         while running.is_set():
-            imu_obj.get_euler_angles()
-            time.sleep(0.001)
+            if imu_obj.fifo_mode:
+                imu_obj.read_fifo()
+            else:
+                imu_obj.get_euler_angles()
+            loop.wait()
             
-        #Reports encoder position
-    def get_vel_thread(self, node_id, bus, running):
-        while running.is_set():
-            message = bus.recv()  # Blocking call
-            if message.arbitration_id == (node_id << 5 | 0x09):  # Replace with the correct response ID
-                # Parse the data to get encoder estimates
-                position, velocity = struct.unpack('<ff', message.data)
-                self.encoder_position = position
-                self.encoder_velocity = velocity
+    #Stores the encoder estimates, called by the CanDispatcher for every encoder frame (replaces get_vel_thread)
+    def on_encoder_estimates(self, msg):
+        self.encoder_position, self.encoder_velocity = decode(GET_ENCODER_ESTIMATES, msg.data)
 
-            time.sleep(0.001) 
+    def subscribe_encoder(self, node_id, dispatcher):
+        dispatcher.subscribe(node_id, GET_ENCODER_ESTIMATES, self.on_encoder_estimates)
 
     def add_data_to_database(self, imu_obj, db_path, initial_time, trial_id, velocity_setpoint, running):
+        loop = self.loops['add_data_to_database'] = PeriodicLoop(self.logger_period)
+        last_seq = imu_obj.state.seq
+        #Sample timestamps are time.monotonic(), the database time is seconds since initial_time
+        clock_offset = time.time() - time.monotonic() - initial_time
         while running.is_set():
+            #Log each IMU sample once, all angles from the same sample (a FIFO read publishes a whole batch)
+            states = imu_obj.samples_since(last_seq)
+            if not states:
+                loop.wait()
+                continue
+            self.logger_missed_samples += states[0].seq - last_seq - 1
+            last_seq = states[-1].seq
+
             #Inside this loop, a new connection is created on each iteration
             with sqlite3.connect(db_path) as conn:
-                imuData = [time.time() - initial_time, imu_obj.angle_x, imu_obj.angle_y, imu_obj.angle_z, self.encoder_velocity, velocity_setpoint]
+                encoder_velocity = self.encoder_velocity
+                imuData = [(trial_id, state.timestamp + clock_offset, state.angle_x, state.angle_y, state.angle_z, encoder_velocity, velocity_setpoint) for state in states]
                 sql = ''' INSERT INTO imu_data(trial_id, time, angle_x, angle_y, angle_z, encoder_velocity, velocity_setpoint)
                   VALUES(?, ?, ?, ?, ?, ?, ?) '''
                 cursor = conn.cursor()
-                cursor.execute(sql, (trial_id, *imuData))
+                cursor.executemany(sql, imuData)
                 conn.commit()
-                time.sleep(0.001)
\ No newline at end of file
+            loop.wait()
+
+    #Prints loop rate and jitter statistics of each thread
+    def report_loops(self):
+        for name, loop in self.loops.items():
+            print(loop.report(name))
+        for name, publisher in self.publishers.items():
+            print(publisher.report(name))
@@ -1,17 +1,61 @@
 #Purpose: Update euler angles [x, y, z] of IMU
 
+import os
 import time
 import math
+import json
+import socket
+import struct
+from collections import namedtuple
+import numpy as np
 import board
 import adafruit_lsm9ds1
 
+#LSM9DS1 accel/gyro registers
+OUT_X_L_G = 0x18  # Gyro outputs 0x18-0x1D, accel outputs 0x28-0x2D
+CTRL_REG9 = 0x23
+FIFO_CTRL = 0x2E
+FIFO_SRC = 0x2F
+
+FIFO_EN = 0x02  # CTRL_REG9 bit
+FIFO_MODE_BYPASS = 0x00  # FIFO_CTRL FMODE = 000
+FIFO_MODE_CONTINUOUS = 0xC0  # FIFO_CTRL FMODE = 110
+FIFO_DEPTH = 32
+XG_ODR = 952.0  # Accel/gyro output data rate set by adafruit_lsm9ds1 [Hz]
+
+#Gyro xyz, skip the 10 registers between the two output blocks, accel xyz
+XG_BURST = struct.Struct('<3h10x3h')
+
+#Gyro calibration cache next to this file, reused on startup when the sensor passes a short stationarity check.
+#One entry per sensor, keyed by host, I2C addresses and the optional sensor_id given to InertialMeasurementUnit
+CALIBRATION_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imu_calibration.json')
+CALIBRATION_MAX_AGE = 7 * 24 * 3600  # [s]
+CALIBRATION_MAX_TEMPERATURE_CHANGE = 5.0  # [deg C]
+
+class StateSnapshot(namedtuple('StateSnapshot', ['seq', 'timestamp', 'accel', 'gyro', 'angle_x', 'angle_y', 'angle_z'])):
+    #Immutable IMU sample. The IMU thread publishes a new one by swapping a single reference,
+    #so readers always see accel, gyro and angles from the same sample without locking.
+    #seq increases by one per sample so readers can count missed and duplicate samples,
+    #timestamp is time.monotonic() when the sample was read. A FIFO read publishes one snapshot per FIFO slot,
+    #each newer slot one sensor period later, the newest at the time of the read
+    __slots__ = ()
+
+
 class InertialMeasurementUnit:
-    def __init__(self):
+    def __init__(self, fifo_mode=False, calibration_cache=CALIBRATION_CACHE, sensor_id=None):
         i2c = board.I2C()
         self.lsm = adafruit_lsm9ds1.LSM9DS1_I2C(i2c)
+
+        #Label of this IMU board (e.g. "pendulum-imu-2"), tells boards swapped on the same Pi and address apart
+        self.sensor_id = sensor_id
         self.accel_range = adafruit_lsm9ds1.ACCELRANGE_2G
         self.gyro_scale = adafruit_lsm9ds1.GYROSCALE_245DPS
 
+        #Burst read buffer and raw-to-SI scale factors, same units as lsm.acceleration and lsm.gyro
+        self.burst_buffer = bytearray(XG_BURST.size)
+        self.accel_lsb = self.lsm._accel_mg_lsb / 1000.0 * 9.80665
+        self.gyro_lsb = math.radians(self.lsm._gyro_dps_digit)
+
         self.prev_time = time.monotonic()
 
         #Euler angles
@@ -32,16 +76,41 @@ class InertialMeasurementUnit:
         # Filter coefficient for complementary filter
         self.alpha = 0.9
 
-        #Calibrate gyro
-        self.calibrate_gyro()
+        #Latest published sample, and every sample published by the last read (oldest first)
+        self.seq = 0
+        self.state = StateSnapshot(0, time.monotonic(), (0.0, 0.0, 0.0), (0.0, 0.0, 0.0), 0.0, 0.0, 0.0)
+        self.recent = (self.state,)
+
+        #FIFO acquisition, samples are drained in batches roughly every half FIFO
+        self.fifo_mode = fifo_mode
+        self.fifo_period = 1.0 / XG_ODR
+        self.poll_interval = FIFO_DEPTH / 2 * self.fifo_period
+        self.fifo_raw = np.empty((FIFO_DEPTH, 6))
+        self.fifo_offsets = np.arange(FIFO_DEPTH)[::-1] * self.fifo_period  # Age of each slot in a full batch [s]
+
+        #Calibrate gyro, or reuse the cached calibration when it still holds
+        self.calibration_cache = calibration_cache
+        self.load_or_calibrate_gyro()
+
+        #Enable FIFO after calibration so calibration reads the live output registers
+        if self.fifo_mode:
+            self.enable_fifo()
 
         #IMU data array to be appended to InvPendDatabase
         self.rawGyroArray = []
         self.rawAccelArray = []
         self.eulerAngleArray = []
 
-    def get_accel_angle(self):
-        ax, ay, az = self.lsm.acceleration
+    def read_accel_gyro(self):
+        #Read gyro and accel outputs in one auto-increment burst so both come from the same sample
+        self.lsm._read_bytes(adafruit_lsm9ds1._XGTYPE, OUT_X_L_G, XG_BURST.size, self.burst_buffer)
+        gx, gy, gz, ax, ay, az = XG_BURST.unpack_from(self.burst_buffer)
+        accel_lsb = self.accel_lsb
+        gyro_lsb = self.gyro_lsb
+        return (ax * accel_lsb, ay * accel_lsb, az * accel_lsb), (gx * gyro_lsb, gy * gyro_lsb, gz * gyro_lsb)
+
+    def get_accel_angle(self, accel=None):
+        ax, ay, az = self.lsm.acceleration if accel is None else accel
         self.rawAccelArray = [ax, ay, az]
 
         # Calculate roll and pitch angles from accelerometer data
@@ -50,8 +119,8 @@ class InertialMeasurementUnit:
 
         return accel_angle_x, accel_angle_y
 
-    def get_gyro_angle(self):
-        gx, gy, gz = self.lsm.gyro
+    def get_gyro_angle(self, gyro=None):
+        gx, gy, gz = self.lsm.gyro if gyro is None else gyro
         self.rawGyroArray = [gx, gy, gz]
 
         gx -= self.gyro_offset_x
@@ -66,38 +135,195 @@ class InertialMeasurementUnit:
         self.gyro_angle_z = self.angle_z + gz * dt
         return self.gyro_angle_x, self.gyro_angle_y, self.gyro_angle_z
     
+    def collect_gyro(self, samples, interval):
+        gyro = np.empty((samples, 3))
+        for i in range(samples):
+            gyro[i] = self.read_accel_gyro()[1]
+            time.sleep(interval)
+        return gyro
+
+    def sensor_identity(self):
+        #Cache key of this sensor: host, I2C addresses of both dies, sensor_id and the gyro scale.
+        #WHO_AM_I is the same on every LSM9DS1, so it cannot tell boards apart
+        return (f"{socket.gethostname()}/xg=0x{self.lsm._xg_device.device_address:02x}/mag=0x{self.lsm._mag_device.device_address:02x}"
+                f"/id={self.sensor_id}/gyro_dps_digit={self.lsm._gyro_dps_digit}")
+
+    def read_calibration_cache(self):
+        #All cached calibrations, by sensor identity
+        if not (self.calibration_cache and os.path.exists(self.calibration_cache)):
+            return {}
+        try:
+            with open(self.calibration_cache) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            print("Unreadable IMU calibration cache, recalibrating")
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
     def calibrate_gyro(self, samples=1000):
         print("Calibrating gyro. Please keep the sensor stationary...")
-        
-        sum_gx = 0
-        sum_gy = 0
-        sum_gz = 0
-        
-        for _ in range(samples):
-            gx, gy, gz = self.lsm.gyro
-            sum_gx += gx
-            sum_gy += gy
-            sum_gz += gz
-
-            time.sleep(0.01)
-        
+
+        gyro = self.collect_gyro(samples, 0.01)
+
         # Calculate average
-        self.gyro_offset_x = sum_gx / samples
-        self.gyro_offset_y = sum_gy / samples
-        self.gyro_offset_z = sum_gz / samples
-        
+        self.gyro_offset_x, self.gyro_offset_y, self.gyro_offset_z = gyro.mean(axis=0).tolist()
+
+        #Save calibration so the next start can skip it
+        if self.calibration_cache:
+            calibration = {
+                'gyro_offset': gyro.mean(axis=0).tolist(),
+                'gyro_variance': gyro.var(axis=0, ddof=1).tolist(),
+                'samples': samples,
+                'temperature': self.lsm.temperature,
+                'timestamp': time.time(),
+            }
+            cache = self.read_calibration_cache()
+            cache[self.sensor_identity()] = calibration
+            with open(self.calibration_cache, 'w') as f:
+                json.dump(cache, f, indent=4)
+
         print("Gyro calibration done!")
 
+    def load_or_calibrate_gyro(self, check_time=0.2, check_interval=0.002):
+        identity = self.sensor_identity()
+        calibration = self.read_calibration_cache().get(identity)
+        if calibration is None:
+            print(f"No cached gyro calibration for {identity}")
+
+        if calibration is not None:
+            reason = None
+            if time.time() - calibration['timestamp'] > CALIBRATION_MAX_AGE:
+                reason = "calibration too old"
+            elif abs(self.lsm.temperature - calibration['temperature']) > CALIBRATION_MAX_TEMPERATURE_CHANGE:
+                reason = "temperature changed"
+            else:
+                #Short stationarity check: the sensor must be as quiet as during calibration,
+                #and its mean rate must agree with the cached offset within the noise of the check
+                gyro = self.collect_gyro(int(check_time / check_interval), check_interval)
+                offset = np.array(calibration['gyro_offset'])
+                variance = np.array(calibration['gyro_variance'])
+                noise_floor = self.gyro_lsb**2
+                check_variance = gyro.var(axis=0, ddof=1)
+                tolerance = 4 * np.sqrt((variance + noise_floor) / len(gyro))
+                if np.any(check_variance > 4 * (variance + noise_floor)):
+                    reason = "sensor not stationary"
+                elif np.any(np.abs(gyro.mean(axis=0) - offset) > tolerance):
+                    reason = "gyro offset drifted"
+
+            if reason is None:
+                self.gyro_offset_x, self.gyro_offset_y, self.gyro_offset_z = calibration['gyro_offset']
+                print(f"Using cached gyro calibration for {identity}")
+                return
+            print(f"Cached gyro calibration rejected: {reason}")
+
+        self.calibrate_gyro()
+
+
+    def enable_fifo(self):
+        #Reset the FIFO through bypass mode, then start continuous mode (oldest samples are overwritten when full)
+        ctrl_reg9 = self.lsm._read_u8(adafruit_lsm9ds1._XGTYPE, CTRL_REG9)
+        self.lsm._write_u8(adafruit_lsm9ds1._XGTYPE, CTRL_REG9, ctrl_reg9 | FIFO_EN)
+        self.lsm._write_u8(adafruit_lsm9ds1._XGTYPE, FIFO_CTRL, FIFO_MODE_BYPASS)
+        self.lsm._write_u8(adafruit_lsm9ds1._XGTYPE, FIFO_CTRL, FIFO_MODE_CONTINUOUS)
+        self.prev_time = time.monotonic()
+
+    def disable_fifo(self):
+        self.lsm._write_u8(adafruit_lsm9ds1._XGTYPE, FIFO_CTRL, FIFO_MODE_BYPASS)
+        ctrl_reg9 = self.lsm._read_u8(adafruit_lsm9ds1._XGTYPE, CTRL_REG9)
+        self.lsm._write_u8(adafruit_lsm9ds1._XGTYPE, CTRL_REG9, ctrl_reg9 & ~FIFO_EN)
+
+    def read_fifo(self):
+        #Number of unread samples (FSS bits 5:0, 32 when full)
+        count = self.lsm._read_u8(adafruit_lsm9ds1._XGTYPE, FIFO_SRC) & 0x3F
+        if count == 0:
+            return 0
+
+        #Each burst pops one gyro + accel slot from the FIFO
+        raw = self.fifo_raw
+        for i in range(count):
+            self.lsm._read_bytes(adafruit_lsm9ds1._XGTYPE, OUT_X_L_G, XG_BURST.size, self.burst_buffer)
+            raw[i] = XG_BURST.unpack_from(self.burst_buffer)
+
+        gyro = raw[:count, :3] * self.gyro_lsb
+        accel = raw[:count, 3:] * self.accel_lsb
+        self.rawGyroArray = gyro[-1].tolist()
+        self.rawAccelArray = accel[-1].tolist()
+
+        angles = self.filter_batch(accel, gyro)
+        self.prev_time = time.monotonic()
+        self.publish_batch(self.prev_time - self.fifo_offsets[-count:], accel, gyro, angles)
+        self.update_read_rate(count)
+        return count
+
+    def filter_batch(self, accel, gyro):
+        #Complementary filter over a batch of samples spaced by the sensor period:
+        #angle[k] = alpha * (angle[k-1] + gyro[k] * dt) + (1 - alpha) * accel_angle[k]
+        #which unrolls to angle[k] = alpha^k * (angle[0] + sum_j<=k (alpha * gyro[j] * dt + (1 - alpha) * accel_angle[j]) / alpha^j)
+        dt = self.fifo_period
+        alpha = self.alpha
+        ax, ay, az = accel.T
+        gx = gyro[:, 0] - self.gyro_offset_x
+        gy = gyro[:, 1] - self.gyro_offset_y
+        gz = gyro[:, 2] - self.gyro_offset_z
+
+        accel_angle_x = np.arctan2(ay, az) * 180 / np.pi
+        accel_angle_y = np.arctan2(ax, np.sqrt(ay**2 + az**2)) * 180 / np.pi
+
+        p = alpha ** np.arange(1, len(accel) + 1)
+        angle_x = p * (self.angle_x + np.cumsum((alpha * gx * dt + (1.0 - alpha) * accel_angle_x) / p))
+        angle_y = p * (self.angle_y + np.cumsum((alpha * gy * dt + (1.0 - alpha) * accel_angle_y) / p))
+        angle_z = self.angle_z + np.cumsum(gz * dt)  # Yaw is only from gyro
+
+        self.angle_x = float(angle_x[-1])
+        self.angle_y = float(angle_y[-1])
+        self.angle_z = float(angle_z[-1])
+        return np.column_stack((angle_x, angle_y, angle_z))
+
+    def publish(self, timestamp):
+        #Single reference assignments, atomic for readers in other threads
+        self.seq += 1
+        state = StateSnapshot(self.seq, timestamp, tuple(self.rawAccelArray), tuple(self.rawGyroArray), self.angle_x, self.angle_y, self.angle_z)
+        self.recent = (state,)
+        self.state = state
+
+    def publish_batch(self, timestamps, accel, gyro, angles):
+        #One snapshot per FIFO slot, seq counts every sample of the batch
+        seq = self.seq
+        batch = tuple(StateSnapshot(seq + i, t, tuple(a), tuple(g), x, y, z)
+                      for i, (t, a, g, (x, y, z)) in enumerate(zip(timestamps.tolist(), accel.tolist(), gyro.tolist(), angles.tolist()), 1))
+        self.seq = batch[-1].seq
+        self.recent = batch
+        self.state = batch[-1]
+
+    def samples_since(self, last_seq):
+        #Snapshots published after last_seq by the latest read, oldest first. Samples of earlier reads are gone,
+        #readers count them as missed from the gap between last_seq and the first returned seq
+        recent = self.recent
+        first = recent[0].seq
+        if last_seq >= recent[-1].seq:
+            return ()
+        return recent[max(last_seq + 1 - first, 0):]
+
+    def update_read_rate(self, samples=1):
+        self.imu_read_count += samples
+        elapsed = time.monotonic() - self.imu_rate_time
+        if elapsed >= 1.0:
+            self.imu_read_rate = self.imu_read_count / elapsed
+            self.imu_read_count = 0
+            self.imu_rate_time += elapsed
 
     def complementary_filter(self, accel_angle, gyro_angle):
         return self.alpha * (gyro_angle) + (1.0 - self.alpha) * accel_angle
 
     def get_euler_angles(self):
         #Get raw accel and gyro data from IMU
-        accel_angle_x, accel_angle_y = self.get_accel_angle()
-        gyro_angle_x, gyro_angle_y, gyro_angle_z = self.get_gyro_angle()
+        accel, gyro = self.read_accel_gyro()
+        accel_angle_x, accel_angle_y = self.get_accel_angle(accel)
+        gyro_angle_x, gyro_angle_y, gyro_angle_z = self.get_gyro_angle(gyro)
 
         # Apply complementary filter
         self.angle_x = self.complementary_filter(accel_angle_x, gyro_angle_x)
         self.angle_y = self.complementary_filter(accel_angle_y, gyro_angle_y)
-        self.angle_z = gyro_angle_z  # Yaw is only from gyro as magnetometer is not used here
\ No newline at end of file
+        self.angle_z = gyro_angle_z  # Yaw is only from gyro as magnetometer is not used here
+        self.publish(self.prev_time)
+        self.update_read_rate()
@@ -0,0 +1,128 @@
+#Purpose: run a thread loop at a fixed rate on absolute deadlines and record its timing
+#
+#Usage:
+#   loop = PeriodicLoop(0.001)
+#   while running.is_set():
+#       ...work...
+#       loop.wait()
+
+import time
+
+class PeriodicLoop:
+    def __init__(self, period, catch_up=False, spin_time=0.0, bin_width=0.00005, bins=40):
+        self.period = period  # Loop period [s]
+        self.catch_up = catch_up  # True: run missed iterations back-to-back, False: skip them
+        self.spin_time = spin_time  # Busy-wait for the last part of each period, time.sleep overshoots [s]. Holds the GIL, control loops only
+
+        #Histogram bins [s], the last bin collects everything above bins * bin_width
+        self.bin_width = bin_width
+        self.bins = bins
+
+        self.reset()
+
+    def reset(self):
+        #Schedule from now
+        self.start_time = time.monotonic()
+        self.deadline = self.start_time
+        self.last_wake = self.start_time
+
+        #Timing statistics
+        self.iterations = 0
+        self.overruns = 0  # Iterations whose work ran past the next deadline
+        self.skipped = 0  # Deadlines dropped when not catching up
+        self.period_min = float('inf')
+        self.period_max = 0.0
+        self.work_max = 0.0
+        self.jitter_max = 0.0
+        self.period_histogram = [0] * (self.bins + 1)  # Actual period - nominal period, centred on 0
+        self.jitter_histogram = [0] * (self.bins + 1)  # Wake-up time - deadline
+        self.overrun_histogram = {}  # Number of periods late: count
+        self.jitter_samples = LatencyRecorder()  # Recent jitter for percentiles
+
+    def bin(self, value):
+        return min(max(int(value / self.bin_width), 0), self.bins)
+
+    def wait(self):
+        now = time.monotonic()
+        self.work_max = max(self.work_max, now - self.last_wake)
+        self.deadline += self.period
+
+        #Missed deadline
+        if now > self.deadline:
+            late = int((now - self.deadline) // self.period) + 1
+            self.overruns += 1
+            self.overrun_histogram[late] = self.overrun_histogram.get(late, 0) + 1
+            if not self.catch_up:
+                self.skipped += late
+                self.deadline += late * self.period
+
+        #Sleep until just before the deadline, then spin
+        remaining = self.deadline - now
+        if remaining > self.spin_time:
+            time.sleep(remaining - self.spin_time)
+        while time.monotonic() < self.deadline:
+            pass
+
+        wake = time.monotonic()
+        period = wake - self.last_wake
+        jitter = wake - self.deadline
+        self.last_wake = wake
+
+        self.iterations += 1
+        self.period_min = min(self.period_min, period)
+        self.period_max = max(self.period_max, period)
+        self.jitter_max = max(self.jitter_max, jitter)
+        self.period_histogram[self.bin(period - self.period + self.bins // 2 * self.bin_width)] += 1
+        self.jitter_histogram[self.bin(jitter)] += 1
+        self.jitter_samples.record(jitter)
+
+    def rate(self):
+        elapsed = self.last_wake - self.start_time
+        return self.iterations / elapsed if elapsed > 0 else 0.0
+
+    def report(self, name="loop"):
+        if self.iterations == 0:
+            return f"{name}: no iterations"
+        us = 1e6
+        lines = [
+            f"{name}: {self.iterations} iterations at {self.rate():.1f} Hz (target {1 / self.period:.1f} Hz), "
+            f"period min/max: {self.period_min * us:.0f}/{self.period_max * us:.0f} us, "
+            f"max jitter: {self.jitter_max * us:.0f} us, max work: {self.work_max * us:.0f} us, "
+            f"overruns: {self.overruns}, skipped: {self.skipped}",
+        ]
+        lines.append("  " + self.jitter_samples.report("jitter"))
+        lines.append("  jitter histogram [us]: " + ", ".join(
+            f"{i * self.bin_width * us:.0f}{'+' if i == self.bins else ''}: {count}" for i, count in enumerate(self.jitter_histogram) if count))
+        lines.append("  period error histogram [us]: " + ", ".join(
+            f"{(i - self.bins // 2) * self.bin_width * us:+.0f}{'+' if i == self.bins else ''}: {count}" for i, count in enumerate(self.period_histogram) if count))
+        if self.overrun_histogram:
+            lines.append("  overruns by periods late: " + ", ".join(
+                f"{late}: {count}" for late, count in sorted(self.overrun_histogram.items())))
+        return "\n".join(lines)
+
+
+class LatencyRecorder:
+    #Keeps the most recent latencies in a preallocated ring, summarised off the critical path by report()
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.samples = [0.0] * capacity
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, latency):
+        self.samples[self.count % self.capacity] = latency
+        self.count += 1
+        if latency > self.max:
+            self.max = latency
+
+    def percentile(self, ordered, fraction):
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    def report(self, name="latency"):
+        if self.count == 0:
+            return f"{name}: no samples"
+        ordered = sorted(self.samples[:min(self.count, self.capacity)])
+        us = 1e6
+        return (f"{name}: {self.count} samples, "
+                f"min: {ordered[0] * us:.0f} us, median: {self.percentile(ordered, 0.5) * us:.0f} us, "
+                f"99%: {self.percentile(ordered, 0.99) * us:.0f} us, max: {self.max * us:.0f} us")
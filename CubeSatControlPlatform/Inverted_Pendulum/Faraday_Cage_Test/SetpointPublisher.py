@@ -0,0 +1,59 @@
+#Purpose: send setpoints only when they change, plus a slow keep-alive, instead of every loop tick
+#
+#SetpointPublisher wraps an odrive_can actuator. A value is sent when it differs from the last sent one by more
+#than deadband, or when keepalive_period has passed since the last send (the ODrive watchdog, if enabled, must
+#be longer than keepalive_period). StepSchedule holds a piecewise constant profile as a table of
+#(start time, value) pairs, looked up with bisect.
+#
+#Usage:
+#   schedule = StepSchedule([(0, 0.0), (5, 5.0), (10, 10.0)])
+#   publisher = SetpointPublisher(actuator, deadband=0.01, keepalive_period=0.1)
+#   publisher.publish(schedule(time.time() - initial_time))
+
+import time
+from bisect import bisect_right
+
+
+class StepSchedule:
+    def __init__(self, steps, before=0.0):
+        #steps: (start time [s], value) pairs, before: value ahead of the first start time
+        steps = sorted(steps)
+        self.times = [t for t, _ in steps]
+        self.values = [before] + [value for _, value in steps]
+
+    def __call__(self, t):
+        return self.values[bisect_right(self.times, t)]
+
+
+class SetpointPublisher:
+    def __init__(self, actuator, deadband=0.0, keepalive_period=0.1):
+        self.actuator = actuator
+        self.deadband = deadband
+        self.keepalive_period = keepalive_period
+
+        self.last_values = None
+        self.last_sent = 0.0  # time.monotonic() of the last send
+        self.start = time.monotonic()
+        self.sent = 0
+        self.skipped = 0
+
+    def publish(self, *values):
+        #Returns True if the values were sent
+        now = time.monotonic()
+        last_values = self.last_values
+        if (last_values is not None and now - self.last_sent < self.keepalive_period
+                and all(abs(value - last) <= self.deadband for value, last in zip(values, last_values))):
+            self.skipped += 1
+            return False
+
+        self.actuator.set(*values)
+        self.last_values = values
+        self.last_sent = now
+        self.sent += 1
+        return True
+
+    def report(self, name):
+        elapsed = time.monotonic() - self.start
+        total = self.sent + self.skipped
+        return (f"{name}: {self.sent} setpoints sent ({self.sent / elapsed if elapsed else 0.0:.1f} /s), "
+                f"{self.skipped} of {total} unchanged and skipped")
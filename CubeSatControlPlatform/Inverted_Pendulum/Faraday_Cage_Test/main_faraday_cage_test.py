@@ -4,6 +4,7 @@ import time
 import threading
 import can 
 import struct
+from CanDispatcher import open_odrive_bus
 from InertialMeasurementUnit import InertialMeasurementUnit
 from Faraday_Cage_Test_Threads import Faraday_Cage_Test_Threads
 from Faraday_Cage_Test_Database import Faraday_Cage_Test_Database
@@ -21,30 +22,22 @@ print(f"Added Trial with ID: {trial_id}")
 
 #CAN initialization
 node_id = 0
-bus = can.interface.Bus("can0", bustype="socketcan")
-
-while not (bus.recv(timeout=0) is None): pass
-bus.send(can.Message(arbitration_id=(node_id << 5 | 0x07), data=struct.pack('<I', 8), is_extended_id=False))
-
-start_time = time.time()
-timeout = 10  # seconds
-
-for msg in bus:
-    if time.time() - start_time > timeout:
-        print("Timeout waiting for the expected CAN message.")
-        break
-
-    if msg.arbitration_id == (node_id << 5 | 0x01):
-        error, state, result, traj_done = struct.unpack('<IBBB', bytes(msg.data[:7]))
-        if state == 8:
-            break
+#Every received frame goes through the dispatcher, threads subscribe to the IDs they need and
+#only those IDs pass the kernel CAN filters
+bus, dispatcher = open_odrive_bus("can0", [node_id])
 
 
 #Initialize instance of InertialMeasurementUnit
-IMU1 = InertialMeasurementUnit()
+imu_fifo_mode = False  # True: drain the LSM9DS1 FIFO in batches at the full sensor rate
+imu_sensor_id = None  # Label of the IMU board, keeps its gyro calibration apart from other boards
+IMU1 = InertialMeasurementUnit(fifo_mode=imu_fifo_mode, sensor_id=imu_sensor_id)
 
 #Initialize instance of InvertedPendulumPID
 threads = Faraday_Cage_Test_Threads()
+threads.kernel_keepalive = False  # True: the socketcan broadcast manager repeats the velocity setpoint
+
+#Encoder estimates are stored by the dispatcher thread as they arrive
+threads.subscribe_encoder(node_id, dispatcher)
 
 #Global variables
 odrive_error_detected = False
@@ -54,14 +47,12 @@ velocity_setpoint = 0
 #Threads
 read_angle_thread = threading.Thread(target=threads.read_angle_thread, args=(IMU1, running, ))
 set_velocity_thread = threading.Thread(target = threads.set_vel_thread, args=(node_id, bus, velocity_setpoint, initialTime, running, ))
-get_encoder_vel_thread = threading.Thread(target = threads.get_vel_thread, args=(node_id, bus, running, ))
 add_data_to_database = threading.Thread(target=threads.add_data_to_database, args=(IMU1, 'Faraday_Cage_Test_Database.db', initialTime, trial_id, velocity_setpoint, running, ))
 
 #Initiate threads
 print("\nTest Active")
 read_angle_thread.start()
 set_velocity_thread.start()
-get_encoder_vel_thread.start()
 add_data_to_database.start()
 
 #Shutdown can bus upon ctrl+c
@@ -79,12 +70,14 @@ finally:
     # Wait for the threads to stop
     read_angle_thread.join()
     set_velocity_thread.join()
-    get_encoder_vel_thread.join()
     add_data_to_database.join()
+    threads.report_loops()
+    print(f"IMU samples: {IMU1.seq}, missed by logger: {threads.logger_missed_samples}")
 
     bus.send(can.Message(arbitration_id=(node_id << 5 | 0x0d), data=struct.pack('<ff', float(0), 0.0), is_extended_id=False))
     print(f"Successfully set ODrive {node_id} to 0 [rev/s]")
 
     # Shutdown the bus in the finally block to ensure it's always executed
+    dispatcher.shutdown()
     bus.shutdown()
     print("\nProgram terminated gracefully.")
@@ -0,0 +1,207 @@
+#Purpose: tune the InvertedPendulumPID gains offline with Nelder-Mead restarts spread over a process pool
+#
+#Each candidate is scored against a set of randomly perturbed pendulum models (PIDSimulator, vectorized over the
+#perturbations), so the gains have to work on all of them, not just the nominal plant. Restarts are independent and
+#run one per worker, so throughput scales with the number of cores. Every evaluation is cached in a SQLite file keyed
+#by the model parameters and tuning settings, so re-running with the same settings only simulates new points.
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from dataclasses import dataclass, asdict, replace
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIDSimulator import PendulumModel, simulate
+
+
+@dataclass
+class TuningSettings:
+    horizon: float = 3.0  # Simulated time per evaluation [s]
+    dt: float = 0.001  # Controller period [s]
+    perturbations: int = 16  # Perturbed plants per evaluation
+    spread: float = 0.1  # Relative standard deviation of the perturbed model parameters
+    initial_angles: tuple = (2.0, 10.0)  # Range of initial angles [deg], sign random
+    perturbation_seed: int = 0
+    failure_cost: float = 1e4  # Cost of a plant that falls, ITAE otherwise
+    max_evaluations: int = 200  # Per restart
+    xtol: float = 1e-3  # Simplex size in normalized gain space
+    ftol: float = 1e-4  # Relative spread of the simplex costs
+
+
+#Model parameters that are perturbed for robustness
+PERTURBED = ('mass', 'com_length', 'inertia', 'damping', 'wheel_inertia', 'torque_bandwidth')
+
+
+def perturbed_model(model, settings, copies):
+    #Model whose parameters are arrays of settings.perturbations random variations, repeated copies times
+    rng = np.random.default_rng(settings.perturbation_seed)
+    n = settings.perturbations
+    values = {name: getattr(model, name) * rng.lognormal(0.0, settings.spread, n) for name in PERTURBED}
+    low, high = settings.initial_angles
+    values['initial_angle'] = rng.uniform(low, high, n) * rng.choice((-1.0, 1.0), n)
+    return replace(model, **{name: np.tile(value, copies) for name, value in values.items()})
+
+
+def cache_key(model, settings):
+    description = json.dumps({'model': asdict(model), 'settings': asdict(settings)}, sort_keys=True, default=str)
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def open_cache(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('''CREATE TABLE IF NOT EXISTS evaluations(
+        model_key TEXT,
+        p REAL,
+        i REAL,
+        d REAL,
+        cost REAL,
+        PRIMARY KEY (model_key, p, i, d)
+        );''')
+    return conn
+
+
+class Evaluator:
+    #Scores gain sets against the perturbed models, with the cached results of earlier runs
+    def __init__(self, model, settings, cache_path, key):
+        self.model = model
+        self.settings = settings
+        self.cache_path = cache_path
+        self.key = key
+        self.new = {}
+        self.hits = 0
+
+        with open_cache(cache_path) as conn:
+            rows = conn.execute('SELECT p, i, d, cost FROM evaluations WHERE model_key=?', (key,)).fetchall()
+        self.cache = {(p, i, d): cost for p, i, d, cost in rows}
+
+    def __call__(self, gains):
+        #gains: (m, 3), returns m costs. Uncached points are simulated together in one batch
+        gains = np.round(np.atleast_2d(gains), 12)
+        keys = [tuple(float(g) for g in row) for row in gains]
+        costs = np.empty(len(gains))
+        missing = []
+        for index, key in enumerate(keys):
+            if key in self.cache:
+                costs[index] = self.cache[key]
+                self.hits += 1
+            else:
+                missing.append(index)
+
+        if missing:
+            settings = self.settings
+            n = settings.perturbations
+            model = perturbed_model(self.model, settings, len(missing))
+            results = simulate(model, np.repeat(gains[missing], n, axis=0), settings.horizon, settings.dt)
+            itae = np.where(results['failed'], settings.failure_cost, results['itae']).reshape(len(missing), n)
+            for index, cost in zip(missing, itae.mean(axis=1)):
+                costs[index] = cost
+                self.cache[keys[index]] = self.new[keys[index]] = float(cost)
+        return costs
+
+    def save(self):
+        with open_cache(self.cache_path) as conn:
+            conn.executemany('INSERT OR IGNORE INTO evaluations(model_key, p, i, d, cost) VALUES(?, ?, ?, ?, ?)',
+                             [(self.key, *gains, cost) for gains, cost in self.new.items()])
+        self.new = {}
+
+
+def nelder_mead(function, x0, settings, step=0.1):
+    #Nelder-Mead on the unit cube, points outside are clipped. function takes an (m, dim) array
+    dim = len(x0)
+    simplex = np.vstack([x0, x0 + step * np.eye(dim)])
+    simplex = np.where(simplex > 1.0, x0 - step, simplex).clip(0.0, 1.0)
+    costs = function(simplex)
+    evaluations = dim + 1
+
+    while evaluations < settings.max_evaluations:
+        order = np.argsort(costs)
+        simplex, costs = simplex[order], costs[order]
+        if (np.max(np.abs(simplex[1:] - simplex[0])) < settings.xtol
+                or costs[-1] - costs[0] <= settings.ftol * abs(costs[0])):
+            break
+
+        centroid = simplex[:-1].mean(axis=0)
+        reflected = np.clip(2 * centroid - simplex[-1], 0.0, 1.0)
+        reflected_cost = function(reflected)[0]
+        evaluations += 1
+
+        if reflected_cost < costs[0]:
+            expanded = np.clip(3 * centroid - 2 * simplex[-1], 0.0, 1.0)
+            expanded_cost = function(expanded)[0]
+            evaluations += 1
+            if expanded_cost < reflected_cost:
+                simplex[-1], costs[-1] = expanded, expanded_cost
+            else:
+                simplex[-1], costs[-1] = reflected, reflected_cost
+        elif reflected_cost < costs[-2]:
+            simplex[-1], costs[-1] = reflected, reflected_cost
+        else:
+            if reflected_cost < costs[-1]:
+                contracted = centroid + 0.5 * (reflected - centroid)
+            else:
+                contracted = centroid + 0.5 * (simplex[-1] - centroid)
+            contracted_cost = function(contracted)[0]
+            evaluations += 1
+            if contracted_cost < min(reflected_cost, costs[-1]):
+                simplex[-1], costs[-1] = contracted, contracted_cost
+            else:
+                #Shrink towards the best point, all new points in one batch
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                costs[1:] = function(simplex[1:])
+                evaluations += dim
+
+    best = np.argmin(costs)
+    return simplex[best], costs[best], evaluations
+
+
+def tune_restart(model, bounds, settings, cache_path, key, seed):
+    #One Nelder-Mead run from a random start, executed in a worker process
+    lower, upper = np.asarray(bounds, dtype=float).T
+    evaluator = Evaluator(model, settings, cache_path, key)
+    start = np.random.default_rng(seed).uniform(0.0, 1.0, len(lower))
+
+    x, cost, evaluations = nelder_mead(lambda x: evaluator(lower + np.atleast_2d(x) * (upper - lower)), start, settings)
+    evaluator.save()
+    return lower + x * (upper - lower), cost, evaluations, evaluator.hits
+
+
+def tune(model, bounds, settings, restarts=None, workers=None, cache_path='pid_tuning_cache.db', seed=0):
+    """
+    Run restarts independent Nelder-Mead searches over workers processes.
+
+    bounds: ((p_min, p_max), (i_min, i_max), (d_min, d_max))
+    Returns a list of (gains, cost) sorted best first.
+    """
+    workers = workers or os.cpu_count()
+    restarts = restarts or workers
+    key = cache_key(model, settings)
+    open_cache(cache_path).close()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(tune_restart, model, bounds, settings, cache_path, key, seed + restart) for restart in range(restarts)]
+        for restart, future in enumerate(futures):
+            gains, cost, evaluations, hits = future.result()
+            print(f"Restart {restart}: p={gains[0]:.5f}, i={gains[1]:.5f}, d={gains[2]:.5f}, cost {cost:.4g} ({evaluations} evaluations, {hits} cached)")
+            results.append((gains, cost))
+    return sorted(results, key=lambda result: result[1])
+
+
+if __name__ == "__main__":
+    #Tuning configuration, limits as in main.py
+    model = PendulumModel(torque_limit=0.63, setpoint=0.0)
+    bounds = ((-1.0, 0.0), (-2.0, 0.0), (-0.1, 0.0))  # p, i, d
+    settings = TuningSettings()
+    restarts = 2 * os.cpu_count()
+
+    start = time.perf_counter()
+    results = tune(model, bounds, settings, restarts)
+    print(f"Tuning took {time.perf_counter() - start:.1f} s on {os.cpu_count()} cores")
+
+    (p, i, d), cost = results[0]
+    print(f"Best gains (mean ITAE {cost:.4g} over {settings.perturbations} perturbed plants):")
+    print(model.controller.format(p=p, i=i, d=d))
+    with open('tuned_gains.json', 'w') as f:
+        json.dump({'p': p, 'i': i, 'd': d, 'cost': cost, 'settings': asdict(settings), 'model': asdict(model)}, f, indent=4)
@@ -0,0 +1,217 @@
+#Purpose: run the inverted pendulum control loop in its own process, away from the logger's GIL contention
+#
+#The control process reads the IMU, runs the PID and sends the torque. Every sample is written to a
+#shared memory ring buffer, which a separate logger process drains into the database in batches.
+
+import os
+import signal
+import sqlite3
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import can
+from CanDispatcher import NO_FRAMES
+from odrive_can import ODriveNode
+
+#One telemetry record per control tick
+TELEMETRY_DTYPE = np.dtype([
+    ('version', np.int64),  # Index of the record in this slot, -1 while the producer is writing it
+    ('seq', np.int64),
+    ('timestamp', np.float64),  # time.monotonic() of the IMU sample
+    ('accel', np.float64, 3),
+    ('gyro', np.float64, 3),
+    ('angle', np.float64, 3),
+    ('torque', np.float64),
+    ('latency', np.float64),  # Start of the IMU read to bus.send [s]
+])
+
+
+class TelemetryRing:
+    #Single producer, single consumer ring in shared memory. The header holds the number of records
+    #written so far, which the producer increments after each record is complete. The consumer keeps
+    #its own read count and drops records the producer has already overwritten.
+    #Each slot carries a version (seqlock): the producer sets it to -1, writes the record, then sets it
+    #to the record's index. A copied row is only kept if its slot held the expected index both before
+    #and after the copy, otherwise the producer overwrote it meanwhile and the row may be torn.
+    def __init__(self, capacity=16384, name=None):
+        self.capacity = capacity
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=8 + capacity * TELEMETRY_DTYPE.itemsize)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+        self.count = np.ndarray((1,), np.int64, self.shm.buf, 0)
+        self.records = np.ndarray((capacity,), TELEMETRY_DTYPE, self.shm.buf, 8)
+        self.versions = self.records['version']
+        if self.owner:
+            self.count[0] = 0
+            self.versions[:] = -1
+
+        self.read_count = 0
+        self.missed = 0
+        self.torn = 0  # Rows discarded because the producer overwrote them during the copy
+
+    def write(self, state, torque, latency):
+        count = int(self.count[0])
+        slot = count % self.capacity
+        self.versions[slot] = -1
+        record = self.records[slot]
+        record['seq'] = state.seq
+        record['timestamp'] = state.timestamp
+        record['accel'] = state.accel
+        record['gyro'] = state.gyro
+        record['angle'] = (state.angle_x, state.angle_y, state.angle_z)
+        record['torque'] = torque
+        record['latency'] = latency
+        self.versions[slot] = count
+        self.count[0] = count + 1
+
+    def read(self):
+        #Copy of all records written since the last read
+        count = int(self.count[0])
+        start = self.read_count
+        if count - start > self.capacity:
+            self.missed += count - start - self.capacity
+            start = count - self.capacity
+        self.read_count = count
+
+        expected = np.arange(start, count)
+        slots = expected % self.capacity
+        before = self.versions[slots]
+        rows = self.records[slots]
+        after = self.versions[slots]
+
+        #Rows overwritten during the copy are gone, the records that replaced them come with the next read
+        valid = (before == expected) & (after == expected)
+        if not valid.all():
+            discarded = len(rows) - int(valid.sum())
+            self.torn += discarded
+            self.missed += discarded
+            rows = rows[valid]
+        return rows
+
+    def close(self):
+        #Release the numpy views before closing the mapping
+        del self.count, self.records, self.versions
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def set_realtime(cpu=None, priority=None):
+    #Pin the calling process to one core and give it SCHED_FIFO priority when permitted
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+            print(f"Control process pinned to CPU {cpu}")
+        except (AttributeError, OSError) as e:
+            print(f"Could not pin control process to CPU {cpu}: {e}")
+    if priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            print(f"Control process running with SCHED_FIFO priority {priority}")
+        except (AttributeError, OSError) as e:
+            print(f"Could not set SCHED_FIFO priority (needs root or CAP_SYS_NICE): {e}")
+
+
+def control_process(telemetry_name, telemetry_capacity, pid_args, node_id, can_channel, fifo_mode, ready, start, running, cpu, priority, sensor_id=None):
+    #Ctrl+c reaches the whole process group, the parent stops this process through running
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    #Imported here so the parent does not need the IMU libraries
+    from InertialMeasurementUnit import InertialMeasurementUnit
+    from InvertedPendulumPID import InvertedPendulumPID
+
+    telemetry = TelemetryRing(telemetry_capacity, telemetry_name)
+    #Send only, the parent's dispatcher receives the ODrive frames
+    bus = can.interface.Bus(can_channel, bustype="socketcan", can_filters=NO_FRAMES)
+    imu = InertialMeasurementUnit(fifo_mode=fifo_mode, sensor_id=sensor_id)
+    pid = InvertedPendulumPID(*pid_args)
+
+    ready.set()
+    start.wait()
+    set_realtime(cpu, priority)
+
+    try:
+        pid.control_loop_thread(imu, node_id, bus, running, telemetry)
+    finally:
+        bus.send(ODriveNode(node_id).torque(0.0))
+        pid.report_loops()
+        print(f"IMU samples: {imu.seq}, missed by controller: {pid.controller_missed_samples}")
+        bus.shutdown()
+        telemetry.close()
+
+
+def logger_process(telemetry_name, telemetry_capacity, db_path, trial_id, initial_time, logging, period=0.05):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    telemetry = TelemetryRing(telemetry_capacity, telemetry_name)
+
+    #Both processes use the same system wide monotonic clock
+    clock_offset = time.time() - time.monotonic() - initial_time
+
+    sql = ''' INSERT INTO imu_data(trial_id, time, raw_accel_x, raw_accel_y, raw_accel_z, raw_gyro_x, raw_gyro_y, raw_gyro_z, angle_x, angle_y, angle_z)
+                  VALUES(?, ?, ?, ?, ?, ?, ?, ?, ? ,?, ?) '''
+    logged = 0
+    with sqlite3.connect(db_path) as conn:
+        while True:
+            #Drain once more after the stop request so nothing written before it is lost
+            stopping = not logging.is_set()
+            records = telemetry.read()
+            if len(records):
+                rows = np.column_stack((records['timestamp'] + clock_offset, records['accel'], records['gyro'], records['angle'])).tolist()
+                conn.executemany(sql, [(trial_id, *row) for row in rows])
+                conn.commit()
+                logged += len(rows)
+            if stopping:
+                break
+            time.sleep(period)
+
+    print(f"Logger: {logged} samples written, {telemetry.missed} overwritten before logging ({telemetry.torn} during a read)")
+    telemetry.close()
+
+
+class ControlProcess:
+    #Parent side: owns the telemetry ring and starts/stops the control and logger processes
+    def __init__(self, pid_args, node_id, can_channel, db_path, trial_id, fifo_mode=False, cpu=None, priority=None, telemetry_capacity=16384, sensor_id=None):
+        self.db_path = db_path
+        self.trial_id = trial_id
+        self.telemetry = TelemetryRing(telemetry_capacity)
+
+        self.ready = multiprocessing.Event()
+        self.start_event = multiprocessing.Event()
+        self.running = multiprocessing.Event()
+        self.running.set()
+        self.logging = multiprocessing.Event()
+        self.logging.set()
+
+        self.control = multiprocessing.Process(target=control_process, args=(
+            self.telemetry.name, telemetry_capacity, pid_args, node_id, can_channel, fifo_mode,
+            self.ready, self.start_event, self.running, cpu, priority, sensor_id))
+        self.logger = None
+
+    def start(self):
+        #Start the control process and wait until its IMU is calibrated
+        self.control.start()
+        while not self.ready.wait(timeout=0.5):
+            if not self.control.is_alive():
+                raise RuntimeError("Control process exited during setup")
+
+    def go(self, initial_time):
+        #Start logging and release the control loop
+        self.logger = multiprocessing.Process(target=logger_process, args=(
+            self.telemetry.name, self.telemetry.capacity, self.db_path, self.trial_id, initial_time, self.logging))
+        self.logger.start()
+        self.start_event.set()
+
+    def stop(self):
+        self.running.clear()
+        self.start_event.set()  # Release the control process if it never started
+        self.control.join()
+        self.logging.clear()
+        if self.logger is not None:
+            self.logger.join()
+        self.telemetry.close()
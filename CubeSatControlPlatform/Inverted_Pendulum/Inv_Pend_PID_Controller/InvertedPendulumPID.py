@@ -1,9 +1,11 @@
 #Purpose: define threads needed to operate inverted pendulum
 
-from simple_pid import PID
-import struct
+from FastPID import FastPID
 import time
 import can
+from PeriodicLoop import PeriodicLoop, LatencyRecorder
+from CanDispatcher import GET_ENCODER_ESTIMATES
+from odrive_can import ODriveNode, PeriodicActuator, open_actuator, SET_INPUT_VEL, SET_INPUT_TORQUE
 from InertialMeasurementUnit import InertialMeasurementUnit
 from InvPendDatabase import InvPendDatabase
 import sqlite3
@@ -17,66 +19,165 @@ class InvertedPendulumPID:
         self.d_parameter = d
 
         #Setup PID controller
-        self.pid = PID(p, i, d, setpoint=target_angle)
-        self.pid.output_limits = (lower_limit, upper_limit) #RPS bounds on motor
+        self.pid = FastPID(p, i, d, setpoint=target_angle, output_limits=(lower_limit, upper_limit)) #RPS bounds on motor
+
+        #IMU samples skipped by the controller and logger, from StateSnapshot.seq
+        self.controller_missed_samples = 0
+        self.logger_missed_samples = 0
+
+        #Loop rates [s] and timing statistics of each thread
+        self.control_period = 0.001
+        self.control_spin_time = 0.0002  # Busy-wait before each control deadline, the other loops only sleep
+        self.logger_period = 0.001
+        self.loops = {}
+
+        #True: the kernel repeats the setpoint every control_period (odrive_can.PeriodicActuator), the
+        #set_* threads only hand it changed values
+        self.kernel_keepalive = False
+
+        #IMU read to bus.send latency of the fused control loop
+        self.latency = LatencyRecorder()
 
     #Thread to set motor velocity, CHANGE TO TORQUE CONTROL
     def set_vel_thread(self, imu_obj, node_id, bus, running):
-        while running.is_set():
-            velocity = self.pid(imu_obj.angle_x)
-            bus.send(can.Message(arbitration_id=(node_id << 5 | 0x0d), data=struct.pack('<ff', float(velocity), 0.0), is_extended_id=False))
-            
+        loop = self.loops['set_vel_thread'] = PeriodicLoop(self.control_period, spin_time=self.control_spin_time)
+        actuator = open_actuator(bus, node_id, SET_INPUT_VEL, self.control_period, self.kernel_keepalive)
+        try:
+            while running.is_set():
+                #dt from the IMU sample timestamps, a repeated sample does not integrate twice
+                state = imu_obj.state
+                velocity = self.pid.update(state.angle_x, state.timestamp)
+                actuator.set(velocity, 0.0)
+                loop.wait()
+        finally:
+            actuator.stop()
 
 
     # Function to set torque for a specific O-Drive
     def set_torque_thread(self, imu_obj, node_id, bus, running):
-        while running.is_set():
-            torque = self.pid(imu_obj.angle_x)
-            bus.send(can.Message(
-                arbitration_id=(node_id << 5 | 0x0E),  # 0x0E: Set_Input_Torque
-                data=struct.pack('<f', 0),
-                is_extended_id=False
-            ))
-            #print(f"Successfully set ODrive {node_id} to {torque} [Nm]")
-            time.sleep(0.001)
+        loop = self.loops['set_torque_thread'] = PeriodicLoop(self.control_period, spin_time=self.control_spin_time)
+        actuator = open_actuator(bus, node_id, SET_INPUT_TORQUE, self.control_period, self.kernel_keepalive)
+        last_seq = imu_obj.state.seq
+        try:
+            while running.is_set():
+                #Only update the PID on a new IMU sample
+                state = imu_obj.state
+                if state.seq == last_seq:
+                    loop.wait()
+                    continue
+                self.controller_missed_samples += state.seq - last_seq - 1
+                last_seq = state.seq
+
+                torque = self.pid.update(state.angle_x, state.timestamp)
+                actuator.set(0.0)
+                #print(f"Successfully set ODrive {node_id} to {torque} [Nm]")
+                loop.wait()
+        finally:
+            actuator.stop()
 
 
        # Function to set torque to 0 for a specific O-Drive
     def set_torque_0(self, node_id, bus, running):
+        if self.kernel_keepalive:
+            #The kernel sends the frame, this thread only waits for the stop request
+            actuator = PeriodicActuator(bus, node_id, SET_INPUT_TORQUE, self.control_period)
+            while running.is_set():
+                time.sleep(0.05)
+            actuator.stop()
+            return
+
+        loop = self.loops['set_torque_0'] = PeriodicLoop(self.control_period)
+        odrive = ODriveNode(node_id)
         while running.is_set():
-            
-            bus.send(can.Message(
-                arbitration_id=(node_id << 5 | 0x0E),  # 0x0E: Set_Input_Torque
-                data=struct.pack('<f', 0),
-                is_extended_id=False
-            ))
+            bus.send(odrive.torque(0.0))
             #print(f"Successfully set ODrive {node_id} to {torque} [Nm]")
-            time.sleep(0.001)
+            loop.wait()
+
 
+    #Fused sense-compute-actuate loop, replaces read_angle_thread + set_torque_thread
+    #Reads the IMU, updates the PID and sends the torque back-to-back each tick, nothing is printed or logged here
+    #In FIFO mode the loop still runs every control_period and drains whatever the FIFO holds (usually one sample),
+    #the PID is stepped once per sample so a late tick loses no samples, and the last torque is sent
+    #Optional telemetry (ControlProcess.TelemetryRing) receives every sample, torque and latency
+    def control_loop_thread(self, imu_obj, node_id, bus, running, telemetry=None):
+        loop = self.loops['control_loop_thread'] = PeriodicLoop(self.control_period, spin_time=self.control_spin_time)
+        odrive = ODriveNode(node_id)
+        last_seq = imu_obj.state.seq
+        while running.is_set():
+            #Start time before the read so the recorded latency includes the I2C transfer, like motor_controller
+            read_start = time.monotonic()
+            if imu_obj.fifo_mode:
+                imu_obj.read_fifo()
+            else:
+                imu_obj.get_euler_angles()
+            states = imu_obj.samples_since(last_seq)
+            if not states:
+                loop.wait()
+                continue
+            self.controller_missed_samples += states[0].seq - last_seq - 1
+            last_seq = states[-1].seq
+
+            torques = [self.pid.update(state.angle_x, state.timestamp) for state in states]
+            bus.send(odrive.torque(torques[-1]))
+            latency = time.monotonic() - read_start
+            self.latency.record(latency)
+            if telemetry is not None:
+                for state, torque in zip(states, torques):
+                    telemetry.write(state, torque, latency)
+            loop.wait()
 
     #Thread to read in orientation angle from IMU
     def read_angle_thread(self, imu_obj, running):
+        #In FIFO mode, drain all samples queued in the IMU FIFO each time it is about half full
+        loop = self.loops['read_angle_thread'] = PeriodicLoop(imu_obj.poll_interval if imu_obj.fifo_mode else self.control_period)
         while running.is_set():
-            imu_obj.get_euler_angles()
-            time.sleep(0.001)
+            if imu_obj.fifo_mode:
+                imu_obj.read_fifo()
+            else:
+                imu_obj.get_euler_angles()
+            loop.wait()
             
 
+    #Prints loop rate and jitter statistics of each thread
+    def report_loops(self):
+        for name, loop in self.loops.items():
+            print(loop.report(name))
+        if self.latency.count:
+            print(self.latency.report("IMU read to bus.send latency"))
+
     #Prints arm angle and motor velocity
-    def get_pos_vel_thread(self, imu_obj, node_id, bus, running):
+    #Encoder estimates come from the CanDispatcher slot, the bus itself is only read by the dispatcher
+    def get_pos_vel_thread(self, imu_obj, node_id, dispatcher, running):
+        loop = self.loops['get_pos_vel_thread'] = PeriodicLoop(0.01)
+        encoder = dispatcher.slot(node_id, GET_ENCODER_ESTIMATES)
+        last_count = encoder.count
         while running.is_set():
-            for msg in bus:
-                if msg.arbitration_id == (node_id << 5 | 0x09):
-                    pos, vel = struct.unpack('<ff', bytes(msg.data))
-                    print(f"Roll: {imu_obj.angle_x:.2f} degrees, vel: {vel:.3f} [turns/s]")
+            if encoder.count != last_count:
+                last_count = encoder.count
+                pos, vel = encoder.value
+                print(f"Roll: {imu_obj.state.angle_x:.2f} degrees, vel: {vel:.3f} [turns/s]")
+            loop.wait()
 
     def add_data_to_database(self, imu_obj, db_path, db, initial_time, trial_id, running):
+        loop = self.loops['add_data_to_database'] = PeriodicLoop(self.logger_period)
+        last_seq = imu_obj.state.seq
+        #Sample timestamps are time.monotonic(), the database time is seconds since initial_time
+        clock_offset = time.time() - time.monotonic() - initial_time
         while running.is_set():
+            #Log each IMU sample once, all fields from the same sample (a FIFO read publishes a whole batch)
+            states = imu_obj.samples_since(last_seq)
+            if not states:
+                loop.wait()
+                continue
+            self.logger_missed_samples += states[0].seq - last_seq - 1
+            last_seq = states[-1].seq
+
             #Inside this loop, a new connection is created on each iteration
             with sqlite3.connect(db_path) as conn:
-                imuData = [time.time() - initial_time, *imu_obj.rawAccelArray, *imu_obj.rawGyroArray, imu_obj.angle_x, imu_obj.angle_y, imu_obj.angle_z]
+                imuData = [(trial_id, state.timestamp + clock_offset, *state.accel, *state.gyro, state.angle_x, state.angle_y, state.angle_z) for state in states]
                 sql = ''' INSERT INTO imu_data(trial_id, time, raw_accel_x, raw_accel_y, raw_accel_z, raw_gyro_x, raw_gyro_y, raw_gyro_z, angle_x, angle_y, angle_z)
                   VALUES(?, ?, ?, ?, ?, ?, ?, ?, ? ,?, ?) '''
                 cursor = conn.cursor()
-                cursor.execute(sql, (trial_id, *imuData))
+                cursor.executemany(sql, imuData)
                 conn.commit()
-                time.sleep(0.001)
\ No newline at end of file
+            loop.wait()
\ No newline at end of file
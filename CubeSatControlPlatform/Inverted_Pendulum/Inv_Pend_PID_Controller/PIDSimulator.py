@@ -0,0 +1,225 @@
+#Purpose: simulate many PID gain sets at once against a plant model, to tune offline instead of re-running trials
+#
+#Every gain set is one element of the NumPy state arrays, so a whole grid steps together. The PID matches FastPID
+#(derivative on measurement, clamping + back-calculation anti-windup) and the controller conventions of the rigs:
+#angles in degrees, torque in Nm, error = setpoint - angle.
+#
+#Model parameters may be floats or arrays with one value per gain set (used for robustness tests).
+
+import json
+from dataclasses import dataclass, asdict
+import numpy as np
+
+
+@dataclass
+class PendulumModel:
+    """
+    Inverted pendulum balanced by a reaction wheel at the top (Inv_Pend_PID_Controller).
+    J * theta'' = m * g * l * sin(theta) - torque - b * theta', the wheel accelerates with +torque.
+    """
+    mass: float = 0.8  # Pendulum + wheel mass [kg]
+    com_length: float = 0.12  # Pivot to centre of mass [m]
+    inertia: float = 0.012  # Inertia about the pivot [kg m^2]
+    damping: float = 0.001  # Pivot friction [Nm per rad/s]
+    wheel_inertia: float = 1.5e-4  # Reaction wheel + rotor inertia [kg m^2]
+    torque_bandwidth: float = 1000.0  # ODrive current loop bandwidth [rad/s]
+    torque_limit: float = 0.63  # 50% of the ODrive limit, as in main.py [Nm]
+    setpoint: float = 0.0  # Target angle [deg]
+    initial_angle: float = 5.0  # [deg]
+    fall_angle: float = 30.0  # Angle at which the pendulum counts as fallen [deg]
+    controller: str = "InvertedPendulumPID({p}, {i}, {d}, target_angle, pid_lower_limit, pid_upper_limit)"
+
+    def initial_state(self, n):
+        angle = np.broadcast_to(np.radians(self.initial_angle), (n,)).astype(float)
+        return {'angle': angle, 'rate': np.zeros(n), 'torque': np.zeros(n), 'wheel_speed': np.zeros(n), 'failed': np.zeros(n, dtype=bool)}
+
+    def step(self, state, torque_command, dt):
+        torque = state['torque']
+        torque += (torque_command - torque) * np.minimum(1.0, self.torque_bandwidth * dt)
+        acceleration = (self.mass * 9.81 * self.com_length * np.sin(state['angle']) - torque - self.damping * state['rate']) / self.inertia
+        state['rate'] += acceleration * dt
+        state['angle'] += state['rate'] * dt
+        state['wheel_speed'] += torque / self.wheel_inertia * dt
+
+        #A fallen pendulum rests on the stop
+        fallen = np.abs(state['angle']) > np.radians(self.fall_angle)
+        if fallen.any():
+            state['failed'] |= fallen
+            state['angle'][fallen] = np.sign(state['angle'][fallen]) * np.radians(self.fall_angle)
+            state['rate'][fallen] = 0.0
+
+    def measure(self, state):
+        return np.degrees(state['angle'])
+
+
+@dataclass
+class CubeSatModel:
+    """
+    1-DoF CubeSat on an air bearing turned by its reaction wheel (1U_Control), angle from the AS5048B encoder.
+    I * theta'' = torque - b * theta', positive torque command turns the body towards increasing angle.
+    """
+    inertia: float = 0.005  # CubeSat + platform inertia about the bearing axis [kg m^2]
+    damping: float = 1e-4  # Air bearing friction [Nm per rad/s]
+    wheel_inertia: float = 1.5e-4  # [kg m^2]
+    torque_bandwidth: float = 1000.0  # [rad/s]
+    torque_limit: float = 0.63  # As in 1DoFControllerWithEncoder.py [Nm]
+    setpoint: float = 180.0  # [deg]
+    initial_angle: float = 90.0  # [deg]
+    fall_angle: float = np.inf  # Never fails
+    controller: str = "motor_controller({p}, {i}, {d}, angle_setpoint, torque_lower_limit, torque_upper_limit)"
+
+    def initial_state(self, n):
+        angle = np.broadcast_to(np.radians(self.initial_angle), (n,)).astype(float)
+        return {'angle': angle, 'rate': np.zeros(n), 'torque': np.zeros(n), 'wheel_speed': np.zeros(n), 'failed': np.zeros(n, dtype=bool)}
+
+    def step(self, state, torque_command, dt):
+        torque = state['torque']
+        torque += (torque_command - torque) * np.minimum(1.0, self.torque_bandwidth * dt)
+        state['rate'] += (torque - self.damping * state['rate']) / self.inertia * dt
+        state['angle'] += state['rate'] * dt
+        state['wheel_speed'] -= torque / self.wheel_inertia * dt
+
+    def measure(self, state):
+        return np.degrees(state['angle'])
+
+
+def gain_grid(p_values, i_values, d_values):
+    #Every combination of the given gains, shape (n, 3) with columns p, i, d
+    p, i, d = np.meshgrid(p_values, i_values, d_values, indexing='ij')
+    return np.column_stack((p.ravel(), i.ravel(), d.ravel()))
+
+
+def simulate(model, gains, horizon=10.0, dt=0.001, derivative_filter=0.0, rate_limit=None, settle_band=0.5, noise=0.0, seed=None):
+    """
+    Step every gain set against the model for horizon seconds at the controller period dt.
+
+    gains: (n, 3) array of p, i, d
+    settle_band: |error| below which the response counts as settled [deg]
+    noise: standard deviation of the angle measurement noise [deg]
+
+    Returns a dict of per gain set metrics:
+    settling_time [s] (inf if not settled or failed), overshoot [% of the initial error], peak_torque [Nm],
+    saturation_time [s], peak_wheel_speed [turns/s], itae [deg s^2], failed
+    """
+    gains = np.asarray(gains, dtype=float)
+    n = len(gains)
+    kp, ki, kd = gains.T
+    lower, upper = -model.torque_limit, model.torque_limit
+    rng = np.random.default_rng(seed)
+
+    #Back-calculation gain as in FastPID
+    back_calculation = np.divide(np.abs(ki), np.abs(kp), out=np.zeros(n), where=kp != 0)
+    derivative_gain = dt / (derivative_filter + dt)
+    max_step = np.inf if rate_limit is None else rate_limit * dt
+
+    state = model.initial_state(n)
+    measurement = model.measure(state)
+    initial_error = model.setpoint - measurement
+    direction = np.sign(initial_error)
+
+    integral = np.zeros(n)
+    derivative = np.zeros(n)
+    last_output = np.zeros(n)
+    last_measurement = measurement.copy()
+
+    last_outside = np.zeros(n)
+    overshoot = np.zeros(n)
+    peak_torque = np.zeros(n)
+    saturation_time = np.zeros(n)
+    peak_wheel_speed = np.zeros(n)
+    itae = np.zeros(n)
+
+    steps = int(round(horizon / dt))
+    for k in range(steps):
+        t = k * dt
+        measurement = model.measure(state)
+        if noise:
+            measurement = measurement + rng.normal(0.0, noise, n)
+        error = model.setpoint - measurement
+
+        #PID
+        derivative += derivative_gain * (-kd * (measurement - last_measurement) / dt - derivative)
+        last_measurement = measurement
+        integral += ki * error * dt
+        output = kp * error + integral + derivative
+        limited = np.clip(output, lower, upper)
+        if rate_limit is not None and k:
+            limited = np.clip(limited, last_output - max_step, last_output + max_step)
+        integral += back_calculation * (limited - output) * dt
+        np.clip(integral, lower, upper, out=integral)
+        last_output = limited
+
+        model.step(state, limited, dt)
+
+        #Metrics
+        abs_error = np.abs(error)
+        last_outside[abs_error > settle_band] = t
+        np.maximum(overshoot, -direction * error, out=overshoot)
+        np.maximum(peak_torque, np.abs(limited), out=peak_torque)
+        saturation_time += (np.abs(output) >= model.torque_limit) * dt
+        np.maximum(peak_wheel_speed, np.abs(state['wheel_speed']), out=peak_wheel_speed)
+        itae += t * abs_error * dt
+
+    failed = state['failed']
+    settled = (last_outside < horizon - dt * 1.5) & ~failed
+    settling_time = np.where(settled, last_outside + dt, np.inf)
+    overshoot_percent = np.divide(overshoot, np.abs(initial_error), out=np.zeros(n), where=initial_error != 0) * 100
+
+    return {
+        'settling_time': settling_time,
+        'overshoot': overshoot_percent,
+        'peak_torque': peak_torque,
+        'saturation_time': saturation_time,
+        'peak_wheel_speed': peak_wheel_speed / (2 * np.pi),
+        'itae': np.where(failed, np.inf, itae),
+        'failed': failed,
+    }
+
+
+def rank(results, metric='itae', max_overshoot=None):
+    #Indices of the gain sets ordered best first, failed and over-shooting sets last
+    cost = np.array(results[metric], dtype=float)
+    cost[results['failed']] = np.inf
+    if max_overshoot is not None:
+        cost[results['overshoot'] > max_overshoot] = np.inf
+    return np.argsort(cost, kind='stable')
+
+
+def export_gains(model, gains, results, path, count=5, metric='itae', max_overshoot=None):
+    #Write the best gain sets with their metrics and the matching controller constructor to a JSON file
+    best = []
+    for index in rank(results, metric, max_overshoot)[:count]:
+        p, i, d = (float(g) for g in gains[index])
+        best.append({
+            'p': p, 'i': i, 'd': d,
+            'constructor': model.controller.format(p=p, i=i, d=d),
+            **{name: float(values[index]) for name, values in results.items()},
+        })
+    with open(path, 'w') as f:
+        json.dump({'model': type(model).__name__, 'parameters': asdict(model), 'metric': metric, 'best': best}, f, indent=4)
+    return best
+
+
+if __name__ == "__main__":
+    import time
+
+    #Sweep configuration
+    plant = "pendulum"  # "pendulum" or "cubesat"
+    horizon = 10.0  # [s]
+    dt = 0.001  # Controller period [s]
+
+    if plant == "pendulum":
+        model = PendulumModel()
+        gains = gain_grid(np.linspace(-0.5, -0.01, 25), np.linspace(0.0, -1.0, 20), np.linspace(0.0, -0.05, 20))
+    else:
+        model = CubeSatModel()
+        gains = gain_grid(np.linspace(0.0005, 0.02, 25), np.linspace(0.0, 0.002, 20), np.linspace(0.0, 0.005, 20))
+
+    start = time.perf_counter()
+    results = simulate(model, gains, horizon, dt)
+    print(f"Simulated {len(gains)} gain sets for {horizon} s in {time.perf_counter() - start:.1f} s")
+    print(f"Failed: {results['failed'].sum()}, settled: {np.isfinite(results['settling_time']).sum()}")
+
+    for entry in export_gains(model, gains, results, f"best_gains_{plant}.json"):
+        print(f"{entry['constructor']}: settling {entry['settling_time']:.2f} s, overshoot {entry['overshoot']:.1f} %, "
+              f"peak torque {entry['peak_torque']:.3f} Nm, saturated {entry['saturation_time']:.2f} s")
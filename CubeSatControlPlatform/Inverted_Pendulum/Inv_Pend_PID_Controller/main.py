@@ -4,10 +4,11 @@ import time
 import threading
 import can 
 import struct
-from simple_pid import PID
+from CanDispatcher import open_odrive_bus
 from InertialMeasurementUnit import InertialMeasurementUnit
 from InvertedPendulumPID import InvertedPendulumPID
 from InvPendDatabase import InvPendDatabase
+from ControlProcess import ControlProcess
 
 # Define a shared variable or event that threads can check
 running = threading.Event()
@@ -22,27 +23,19 @@ print(f"Added Trial with ID: {trial_id}")
 
 #CAN initialization
 node_id = 0
-bus = can.interface.Bus("can0", bustype="socketcan")
+#Every received frame goes through the dispatcher, threads subscribe to the IDs they need and
+#only those IDs pass the kernel CAN filters
+bus, dispatcher = open_odrive_bus("can0", [node_id])
 
-while not (bus.recv(timeout=0) is None): pass
-bus.send(can.Message(arbitration_id=(node_id << 5 | 0x07), data=struct.pack('<I', 8), is_extended_id=False))
 
-start_time = time.time()
-timeout = 10  # seconds
-
-for msg in bus:
-    if time.time() - start_time > timeout:
-        print("Timeout waiting for the expected CAN message.")
-        break
-
-    if msg.arbitration_id == (node_id << 5 | 0x01):
-        error, state, result, traj_done = struct.unpack('<IBBB', bytes(msg.data[:7]))
-        if state == 8:
-            break
-
-
-#Initialize instance of InertialMeasurementUnit
-IMU1 = InertialMeasurementUnit()
+#Control modes
+imu_fifo_mode = False  # True: drain the LSM9DS1 FIFO in batches at the full sensor rate
+imu_sensor_id = None  # Label of the IMU board, keeps its gyro calibration apart from other boards
+fused_loop = False  # True: read IMU, compute PID and send torque in one thread each tick
+kernel_keepalive = False  # True: the socketcan broadcast manager repeats the torque setpoint, Python only sends changes
+separate_process = False  # True: run the fused loop in its own process, log through shared memory
+control_cpu = 3  # Core the control process is pinned to, None to leave unpinned
+control_priority = 50  # SCHED_FIFO priority of the control process (needs root), None for normal scheduling
 
 #Initialize instance of InvertedPendulumPID
 p_constant = -0.01
@@ -54,7 +47,17 @@ pid_upper_limit = 0.63
 pid_lower_limit = -0.63
 target_angle = 0
 
-pid = InvertedPendulumPID(p_constant, i_constant, d_constant, target_angle, pid_lower_limit, pid_upper_limit)
+pid_args = (p_constant, i_constant, d_constant, target_angle, pid_lower_limit, pid_upper_limit)
+
+if separate_process:
+    #IMU and PID live in the control process
+    control_process = ControlProcess(pid_args, node_id, "can0", 'InvPendIMUatabase.db', trial_id, imu_fifo_mode, control_cpu, control_priority, sensor_id=imu_sensor_id)
+    control_process.start()
+else:
+    #Initialize instance of InertialMeasurementUnit
+    IMU1 = InertialMeasurementUnit(fifo_mode=imu_fifo_mode, sensor_id=imu_sensor_id)
+    pid = InvertedPendulumPID(*pid_args)
+    pid.kernel_keepalive = kernel_keepalive
 
 #Pause to remove lock
 print("\nRemove lock mechanism. Time Remaining:\n")
@@ -69,18 +72,28 @@ while (time_remaining != 0):
 odrive_error_detected = False
 initialTime = time.time()
 
-#Threads
-read_angle_thread = threading.Thread(target=pid.read_angle_thread, args=(IMU1, running, ))
-set_motor_torque_thread = threading.Thread(target=pid.set_torque_thread, args=(IMU1, node_id, bus, running))
-#print_thread = threading.Thread(target=pid.get_pos_vel_thread, args=(IMU1, node_id, bus, running, ))
-add_data_to_database = threading.Thread(target=pid.add_data_to_database, args=(IMU1, 'InvPendIMUatabase.db', invPendPIDDatabase, initialTime, trial_id, running, ))
+#Threads (the separate control process runs its own loop and logger)
+if not separate_process:
+    if fused_loop:
+        control_thread = threading.Thread(target=pid.control_loop_thread, args=(IMU1, node_id, bus, running))
+    else:
+        read_angle_thread = threading.Thread(target=pid.read_angle_thread, args=(IMU1, running, ))
+        set_motor_torque_thread = threading.Thread(target=pid.set_torque_thread, args=(IMU1, node_id, bus, running))
+    #print_thread = threading.Thread(target=pid.get_pos_vel_thread, args=(IMU1, node_id, dispatcher, running, ))
+    add_data_to_database = threading.Thread(target=pid.add_data_to_database, args=(IMU1, 'InvPendIMUatabase.db', invPendPIDDatabase, initialTime, trial_id, running, ))
 
 #Initiate threads
 print("\nPID Active")
-read_angle_thread.start()
-set_motor_torque_thread.start()
-#print_thread.start()
-add_data_to_database.start()
+if separate_process:
+    control_process.go(initialTime)
+else:
+    if fused_loop:
+        control_thread.start()
+    else:
+        read_angle_thread.start()
+        set_motor_torque_thread.start()
+    #print_thread.start()
+    add_data_to_database.start()
 
 #Shutdown can bus upon ctrl+c
 try:
@@ -94,15 +107,24 @@ except KeyboardInterrupt:
     print("\nThreads cleared!")
 
 finally:
-    # Wait for the threads to stop
-    read_angle_thread.join()
-    set_motor_torque_thread.join()
-    #print_thread.join()
-    add_data_to_database.join()
+    # Wait for the threads (or control and logger processes) to stop
+    if separate_process:
+        control_process.stop()
+    else:
+        if fused_loop:
+            control_thread.join()
+        else:
+            read_angle_thread.join()
+            set_motor_torque_thread.join()
+        #print_thread.join()
+        add_data_to_database.join()
+        pid.report_loops()
+        print(f"IMU samples: {IMU1.seq}, missed by controller: {pid.controller_missed_samples}, missed by logger: {pid.logger_missed_samples}")
 
     bus.send(can.Message(arbitration_id=(node_id << 5 | 0x0E), data=struct.pack('<f', 0.0), is_extended_id=False))
     print(f"Successfully set ODrive {node_id} to 0 [Nm]")
 
     # Shutdown the bus in the finally block to ensure it's always executed
+    dispatcher.shutdown()
     bus.shutdown()
     print("\nProgram terminated gracefully.")
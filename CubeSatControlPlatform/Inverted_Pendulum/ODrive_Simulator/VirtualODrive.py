@@ -0,0 +1,198 @@
+#Purpose: simulated ODrive node speaking CAN-simple, so the experiments can run without hardware
+
+import math
+import struct
+import threading
+import time
+from dataclasses import dataclass
+import can
+
+#CAN-simple command IDs (arbitration_id = node_id << 5 | command)
+HEARTBEAT = 0x01
+SET_AXIS_STATE = 0x07
+GET_ENCODER_ESTIMATES = 0x09
+SET_INPUT_VEL = 0x0D
+SET_INPUT_TORQUE = 0x0E
+GET_TORQUES = 0x1C
+
+#Axis states
+AXIS_STATE_IDLE = 1
+AXIS_STATE_CLOSED_LOOP_CONTROL = 8
+
+
+@dataclass
+class MotorModel:
+    """
+    Dynamic model of the motor and reaction wheel driven by the simulated ODrive.
+    Positions are in turns, velocities in turns/s and torques in Nm, like the ODrive.
+    """
+    inertia: float = 1.5e-4  # Rotor + wheel inertia [kg m^2]
+    viscous_friction: float = 2e-5  # [Nm per rad/s]
+    coulomb_friction: float = 2e-3  # [Nm]
+    torque_limit: float = 1.26  # Motor torque limit [Nm], the experiments use 50% of this
+    torque_bandwidth: float = 1000.0  # Current loop bandwidth, lag between torque setpoint and torque [rad/s]
+    vel_gain: float = 0.16  # Velocity controller proportional gain [Nm per turn/s]
+    vel_integrator_gain: float = 0.32  # Velocity controller integrator gain [Nm per turn]
+    vel_limit: float = 50.0  # Velocity setpoint limit [turns/s]
+
+
+class VirtualODrive:
+    """
+    Simulated ODrive axis attached to a python-can bus (virtual, vcan or udp_multicast).
+
+    Implements the CAN-simple commands used by the experiments: Set_Axis_State, Set_Input_Vel and
+    Set_Input_Torque are received, Heartbeat, Get_Encoder_Estimates and Get_Torques are broadcast
+    cyclically (and answered when requested with an RTR frame).
+    """
+
+    def __init__(self, bus, node_id=0, model=None, heartbeat_period=0.1, encoder_period=0.01, torques_period=0.01, step=0.0005):
+        self.bus = bus
+        self.node_id = node_id
+        self.model = model if model is not None else MotorModel()
+        self.step = step  # Physics integration step [s]
+
+        #Cyclic broadcast periods [s], 0 disables the message
+        self.periods = {
+            HEARTBEAT: heartbeat_period,
+            GET_ENCODER_ESTIMATES: encoder_period,
+            GET_TORQUES: torques_period,
+        }
+
+        #Axis state
+        self.axis_error = 0
+        self.axis_state = AXIS_STATE_IDLE
+        self.control_mode = SET_INPUT_TORQUE
+        self.vel_setpoint = 0.0
+        self.torque_feedforward = 0.0
+        self.torque_setpoint = 0.0
+        self.vel_integrator = 0.0
+
+        #Plant state
+        self.torque_target = 0.0
+        self.torque_estimate = 0.0
+        self.position = 0.0  # [turns]
+        self.velocity = 0.0  # [turns/s]
+
+        #Receive statistics per command ID, for load and latency tests
+        self.rx_count = {}
+        self.rx_latency_sum = 0.0
+        self.rx_latency_max = 0.0
+        self.tx_count = 0
+
+        self.running = threading.Event()
+        self.thread = None
+
+    def arbitration_id(self, command):
+        return self.node_id << 5 | command
+
+    def start(self):
+        self.running.set()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def run(self):
+        now = time.monotonic()
+        sim_time = now
+        next_broadcast = {command: now for command, period in self.periods.items() if period}
+
+        while self.running.is_set():
+            #Wait for a command until the next physics step or broadcast is due
+            next_event = min([sim_time + self.step, *next_broadcast.values()])
+            msg = self.bus.recv(timeout=max(0.0, next_event - time.monotonic()))
+            if msg is not None:
+                self.handle(msg)
+
+            #Integrate the plant up to the current time
+            now = time.monotonic()
+            while sim_time + self.step <= now:
+                self.update(self.step)
+                sim_time += self.step
+
+            #Send the cyclic messages that are due, skipping any periods that were missed
+            for command, deadline in next_broadcast.items():
+                if now >= deadline:
+                    self.send(command)
+                    period = self.periods[command]
+                    next_broadcast[command] = deadline + period * (1 + int((now - deadline) // period))
+
+    def handle(self, msg):
+        if msg.is_extended_id or msg.arbitration_id >> 5 != self.node_id:
+            return
+        command = msg.arbitration_id & 0x1F
+
+        self.rx_count[command] = self.rx_count.get(command, 0) + 1
+        latency = time.time() - msg.timestamp
+        self.rx_latency_sum += latency
+        self.rx_latency_max = max(self.rx_latency_max, latency)
+
+        if msg.is_remote_frame:
+            if command in (HEARTBEAT, GET_ENCODER_ESTIMATES, GET_TORQUES):
+                self.send(command)
+        elif command == SET_AXIS_STATE:
+            requested_state, = struct.unpack('<I', bytes(msg.data[:4]))
+            if requested_state in (AXIS_STATE_IDLE, AXIS_STATE_CLOSED_LOOP_CONTROL):
+                self.axis_state = requested_state
+                self.vel_integrator = 0.0
+        elif command == SET_INPUT_VEL:
+            self.vel_setpoint, self.torque_feedforward = struct.unpack('<ff', bytes(msg.data[:8]))
+            self.control_mode = SET_INPUT_VEL
+        elif command == SET_INPUT_TORQUE:
+            self.torque_setpoint, = struct.unpack('<f', bytes(msg.data[:4]))
+            self.control_mode = SET_INPUT_TORQUE
+
+    def update(self, dt):
+        model = self.model
+
+        #Controller
+        if self.axis_state != AXIS_STATE_CLOSED_LOOP_CONTROL:
+            torque_target = 0.0
+        elif self.control_mode == SET_INPUT_VEL:
+            vel_setpoint = max(-model.vel_limit, min(model.vel_limit, self.vel_setpoint))
+            vel_error = vel_setpoint - self.velocity
+            torque_target = model.vel_gain * vel_error + self.vel_integrator + self.torque_feedforward
+            #Only integrate while not saturated (anti-windup)
+            if abs(torque_target) < model.torque_limit:
+                self.vel_integrator += model.vel_integrator_gain * vel_error * dt
+        else:
+            torque_target = self.torque_setpoint
+        self.torque_target = max(-model.torque_limit, min(model.torque_limit, torque_target))
+
+        #Current loop lag
+        self.torque_estimate += (self.torque_target - self.torque_estimate) * min(1.0, model.torque_bandwidth * dt)
+
+        #Wheel dynamics
+        omega = self.velocity * 2 * math.pi
+        friction = model.viscous_friction * omega + math.copysign(model.coulomb_friction, omega) * (omega != 0.0)
+        omega += (self.torque_estimate - friction) / model.inertia * dt
+        self.velocity = omega / (2 * math.pi)
+        self.position += self.velocity * dt
+
+    def send(self, command):
+        if command == HEARTBEAT:
+            data = struct.pack('<IBBBx', self.axis_error, self.axis_state, 0, 1)
+        elif command == GET_ENCODER_ESTIMATES:
+            data = struct.pack('<ff', self.position, self.velocity)
+        elif command == GET_TORQUES:
+            data = struct.pack('<ff', self.torque_target, self.torque_estimate)
+        else:
+            return
+        self.bus.send(can.Message(arbitration_id=self.arbitration_id(command), data=data, is_extended_id=False))
+        self.tx_count += 1
+
+    def stats(self):
+        received = sum(self.rx_count.values())
+        mean_latency = self.rx_latency_sum / received if received else 0.0
+        return f"rx: {received} frames {self.rx_count}, tx: {self.tx_count} frames, rx latency mean: {mean_latency * 1e6:.0f} us, max: {self.rx_latency_max * 1e6:.0f} us"
@@ -0,0 +1,43 @@
+#Run a simulated ODrive node on a CAN interface
+#
+#The experiments open "can0" with socketcan. On a machine without hardware, create a virtual
+#interface with that name and run this script next to the experiment:
+#
+#   sudo modprobe vcan
+#   sudo ip link add dev can0 type vcan
+#   sudo ip link set up can0
+#
+#For in-process load tests, use interface "virtual" and share the channel name with the bus
+#the controller uses.
+
+import time
+import can
+from VirtualODrive import VirtualODrive, MotorModel
+
+#CAN initialization
+node_id = 0
+channel = "can0"
+interface = "socketcan"
+bus = can.interface.Bus(channel, interface=interface)
+
+#Motor + reaction wheel model
+model = MotorModel()
+
+odrive = VirtualODrive(bus, node_id, model)
+odrive.start()
+print(f"Virtual ODrive {node_id} running on {channel}")
+
+#Shutdown can bus upon ctrl+c
+try:
+    while True:
+        time.sleep(1)
+        print(f"pos: {odrive.position:.3f} [turns], vel: {odrive.velocity:.3f} [turns/s], torque: {odrive.torque_estimate:.3f} [Nm]")
+        print(odrive.stats())
+
+except KeyboardInterrupt:
+    print("\nStopping virtual ODrive")
+
+finally:
+    odrive.stop()
+    bus.shutdown()
+    print("\nProgram terminated gracefully.")
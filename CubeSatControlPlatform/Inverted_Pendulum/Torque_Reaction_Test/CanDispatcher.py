@@ -0,0 +1,169 @@
+#Purpose: read the CAN bus in one place and route each ODrive frame to whoever subscribed to it
+#
+#A can.Notifier thread receives every frame once and looks up its arbitration ID in a dict. Subscribers get:
+#   - callback: called with the message in the notifier thread, keep it short
+#   - slot: LatestValue holding the last decoded payload, for threads that only need the newest value
+#   - queue: every message of that ID, for threads that must see each one
+#
+#The subscribed IDs are also installed as socketcan filters, so the kernel drops every other frame before it
+#reaches Python (other nodes, unused broadcasts). Without subscriptions nothing is received.
+#
+#Usage:
+#   bus, dispatcher = open_odrive_bus("can0", [node_id])
+#   encoder = dispatcher.slot(node_id, GET_ENCODER_ESTIMATES)
+#   position, velocity = encoder.value
+
+import queue
+import threading
+import can
+
+#Command IDs and decoders come from the codec, re-exported for the threads that subscribe
+from odrive_can import (HEARTBEAT, SET_AXIS_STATE, GET_ENCODER_ESTIMATES, SET_INPUT_VEL, SET_INPUT_TORQUE, GET_TORQUES,
+                        AXIS_STATE_IDLE, AXIS_STATE_CLOSED_LOOP_CONTROL, DECODERS, CommandFrame, arbitration_id)
+
+#Filter no standard frame matches (extended ID 0, the ODrive only sends standard frames)
+NO_FRAMES = [{"can_id": 0, "can_mask": 0x1FFFFFFF, "extended": True}]
+
+
+def id_filters(arbitration_ids):
+    #socketcan filters accepting exactly these standard IDs
+    if not arbitration_ids:
+        return NO_FRAMES
+    return [{"can_id": key, "can_mask": 0x7FF, "extended": False} for key in sorted(arbitration_ids)]
+
+
+class LatestValue:
+    #Last decoded payload of one arbitration ID, count increases with every frame
+    __slots__ = ('decoder', 'value', 'timestamp', 'count')
+
+    def __init__(self, decoder):
+        self.decoder = decoder
+        self.value = None
+        self.timestamp = None
+        self.count = 0
+
+    def __call__(self, msg):
+        self.value = self.decoder.unpack_from(msg.data)
+        self.timestamp = msg.timestamp
+        self.count += 1
+
+
+class CanDispatcher(can.Listener):
+    def __init__(self, bus, kernel_filters=True):
+        self.bus = bus
+        self.kernel_filters = kernel_filters  # Keep the bus filters equal to the subscribed IDs
+        self.routes = {}  # arbitration_id: list of callbacks
+        self.slots = {}  # arbitration_id: LatestValue
+        self.notifier = None
+        self.unrouted = 0  # Frames nobody subscribed to (only possible without kernel filters)
+        self.lock = threading.Lock()  # Serializes subscription changes, the notifier thread never takes it
+        if kernel_filters:
+            self.bus.set_filters(NO_FRAMES)
+
+    def start(self):
+        self.notifier = can.Notifier(self.bus, [self])
+
+    def update_filters(self):
+        #Called with the lock held whenever the set of subscribed IDs changes
+        if self.kernel_filters:
+            self.bus.set_filters(id_filters(self.routes))
+
+    def shutdown(self):
+        #Not named stop(), can.Notifier.stop() calls stop() on its listeners
+        if self.notifier is not None:
+            self.notifier.stop()
+            self.notifier = None
+
+    def on_message_received(self, msg):
+        callbacks = self.routes.get(msg.arbitration_id)
+        if callbacks is None:
+            self.unrouted += 1
+            return
+        for callback in callbacks:
+            callback(msg)
+
+    def on_error(self, exc):
+        print(f"CAN receive error: {exc}")
+
+    def subscribe(self, node_id, command, callback):
+        #Replace the route list instead of appending in place, the notifier thread may be iterating it
+        key = arbitration_id(node_id, command)
+        with self.lock:
+            new_id = key not in self.routes
+            self.routes[key] = self.routes.get(key, []) + [callback]
+            if new_id:
+                self.update_filters()
+
+    def unsubscribe(self, node_id, command, callback):
+        key = arbitration_id(node_id, command)
+        with self.lock:
+            callbacks = [c for c in self.routes.get(key, []) if c is not callback]
+            if callbacks:
+                self.routes[key] = callbacks
+            elif self.routes.pop(key, None) is not None:
+                self.update_filters()
+
+    def slot(self, node_id, command):
+        #Shared LatestValue of a broadcast message (heartbeat, encoder estimates, torques)
+        key = arbitration_id(node_id, command)
+        with self.lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self.slots[key] = LatestValue(DECODERS[command])
+                new_id = key not in self.routes
+                self.routes[key] = self.routes.get(key, []) + [slot]
+                if new_id:
+                    self.update_filters()
+        return slot
+
+    def queue(self, node_id, command):
+        #Every frame of this ID, in order
+        frames = queue.SimpleQueue()
+        self.subscribe(node_id, command, frames.put)
+        return frames
+
+    def wait_for(self, node_id, command, predicate, timeout):
+        #Block until a frame of this ID whose decoded payload satisfies predicate arrives, returns it or None
+        decoder = DECODERS[command]
+        received = threading.Event()
+        result = []
+
+        def check(msg):
+            value = decoder.unpack_from(msg.data)
+            if not received.is_set() and predicate(value):
+                result.append(value)
+                received.set()
+
+        self.subscribe(node_id, command, check)
+        try:
+            received.wait(timeout)
+        finally:
+            self.unsubscribe(node_id, command, check)
+        return result[0] if result else None
+
+    def set_axis_state(self, node_id, state=AXIS_STATE_CLOSED_LOOP_CONTROL, timeout=10):
+        #Startup handshake: request the axis state and wait for a heartbeat reporting it
+        decoder = DECODERS[HEARTBEAT]
+        reached = threading.Event()
+
+        def check(msg):
+            if decoder.unpack_from(msg.data)[1] == state:
+                reached.set()
+
+        self.subscribe(node_id, HEARTBEAT, check)
+        try:
+            self.bus.send(CommandFrame(node_id, SET_AXIS_STATE)(state))
+            return reached.wait(timeout)
+        finally:
+            self.unsubscribe(node_id, HEARTBEAT, check)
+
+
+def open_odrive_bus(channel="can0", node_ids=(0,), state=AXIS_STATE_CLOSED_LOOP_CONTROL, timeout=10, kernel_filters=True):
+    #CAN setup shared by the experiments: open the bus, start the dispatcher and put every node in the requested state
+    bus = can.interface.Bus(channel, bustype="socketcan")
+    dispatcher = CanDispatcher(bus, kernel_filters)
+    dispatcher.start()
+    for node_id in node_ids:
+        if not dispatcher.set_axis_state(node_id, state, timeout):
+            print("Timeout waiting for the expected CAN message.")
+    return bus, dispatcher
@@ -1,9 +1,13 @@
 #Purpose: define threads needed to test torque reaction times
 
-import struct
+import queue
 import time
 import can
 import sqlite3
+from PeriodicLoop import PeriodicLoop
+from CanDispatcher import GET_TORQUES
+from odrive_can import open_actuator, decode, SET_INPUT_TORQUE
+from SetpointPublisher import SetpointPublisher, StepSchedule
 
 class TorqueReactionTestThreads:
     def __init__(self):
@@ -14,56 +18,56 @@ class TorqueReactionTestThreads:
         self.torque_estimate_array = []
         self.time_array = []
 
-    # Function to set torque for a specific O-Drive
-    def set_torque_thread(self, node_id, bus, torque_setpoint, initial_time, running):
-        while running.is_set():
+        #Loop rate [s] and timing statistics of each thread
+        self.setpoint_period = 0.001
+        self.loops = {}
 
-            #Set torque = 0 for first 5 seconds
-            if (time.time() - initial_time) < 5:
-                bus.send(can.Message(
-                    arbitration_id=(node_id << 5 | 0x0E),  # 0x0E: Set_Input_Torque
-                    data=struct.pack('<f', 0),
-                    is_extended_id=False
-                ))
+        #True: the kernel repeats the torque setpoint every setpoint_period (odrive_can.PeriodicActuator)
+        self.kernel_keepalive = False
 
-            #Set torque = torque_setpoint after 5 seconds
-            if (time.time() - initial_time) >= 5 and (time.time() - initial_time) < 7:
-                bus.send(can.Message(
-                    arbitration_id=(node_id << 5 | 0x0E),  # 0x0E: Set_Input_Torque
-                    data=struct.pack('<f', torque_setpoint),
-                    is_extended_id=False
-                ))
-                
-            if (time.time() - initial_time) >= 7:
-                bus.send(can.Message(
-                    arbitration_id=(node_id << 5 | 0x0E),  # 0x0E: Set_Input_Torque
-                    data=struct.pack('<f', 0),
-                    is_extended_id=False
-                ))
+        #Torque pulse: torque_setpoint from pulse_start to pulse_end [s], 0 otherwise
+        self.pulse_start = 5
+        self.pulse_end = 7
 
-            time.sleep(0.001)
+        #Setpoints are sent on a change larger than the deadband, or every keepalive_period [s]
+        self.setpoint_deadband = 0.0
+        self.keepalive_period = 0.1
+        self.publishers = {}
 
-    #Reports encoder position
-    def get_system_torque_thread(self, node_id, bus, initial_time, running):
-        while running.is_set():
-            
-            start_time = time.time()
-            while (time.time() - start_time) < 1:
-                msg = bus.recv(timeout = 1 - (time.time() - start_time))  # Adjust timeout for recv
-                if msg is None:
-                    print("Timeout occurred, no message received.")
-                    break
+    # Function to set torque for a specific O-Drive
+    def set_torque_thread(self, node_id, bus, torque_setpoint, initial_time, running):
+        loop = self.loops['set_torque_thread'] = PeriodicLoop(self.setpoint_period)
+        actuator = open_actuator(bus, node_id, SET_INPUT_TORQUE, self.setpoint_period, self.kernel_keepalive)
+        schedule = StepSchedule([(self.pulse_start, float(torque_setpoint)), (self.pulse_end, 0.0)], before=0.0)
+        publisher = self.publishers['set_torque_thread'] = SetpointPublisher(actuator, self.setpoint_deadband, self.keepalive_period)
+        try:
+            while running.is_set():
+                publisher.publish(schedule(time.time() - initial_time))
+                loop.wait()
+        finally:
+            actuator.stop()
 
-                if msg.arbitration_id == (node_id << 5 | 0x1C):  # 0x1C: Get_Torques
-                    self.torque_setpoint, self.torque_estimate = struct.unpack('<ff', bytes(msg.data))
-                    print(f"O-Drive {node_id} - Torque Target: {self.torque_setpoint:.3f} [Nm], Torque Estimate: {self.torque_estimate:.3f} [Nm]")
+    #Records every Get_Torques frame, queued by the CanDispatcher so none is dropped
+    def get_system_torque_thread(self, node_id, dispatcher, initial_time, running):
+        torques = dispatcher.queue(node_id, GET_TORQUES)
+        while running.is_set():
+            try:
+                msg = torques.get(timeout=1)
+            except queue.Empty:
+                print(f"No torque message received for O-Drive {node_id} within the timeout period.")
+                continue
 
-                    self.time_array.append(time.time() - initial_time)
-                    self.torque_setpoint_array.append(self.torque_setpoint)
-                    self.torque_estimate_array.append(self.torque_estimate)
+            self.torque_setpoint, self.torque_estimate = decode(GET_TORQUES, msg.data)
+            print(f"O-Drive {node_id} - Torque Target: {self.torque_setpoint:.3f} [Nm], Torque Estimate: {self.torque_estimate:.3f} [Nm]")
 
-                    break
-            else:
-                print(f"No torque message received for O-Drive {node_id} within the timeout period.")
+            #Receive time of the frame, not of the dequeue (msg.timestamp is time.time() on socketcan)
+            self.time_array.append(msg.timestamp - initial_time)
+            self.torque_setpoint_array.append(self.torque_setpoint)
+            self.torque_estimate_array.append(self.torque_estimate)
 
-            time.sleep(0.001) 
\ No newline at end of file
+    #Prints loop rate and jitter statistics of each thread
+    def report_loops(self):
+        for name, loop in self.loops.items():
+            print(loop.report(name))
+        for name, publisher in self.publishers.items():
+            print(publisher.report(name))
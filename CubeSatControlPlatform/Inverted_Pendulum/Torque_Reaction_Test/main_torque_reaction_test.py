@@ -4,6 +4,7 @@ import time
 import threading
 import can 
 import struct
+from CanDispatcher import open_odrive_bus
 from TorqueReactionTestThreads import TorqueReactionTestThreads
 from TorqueReactionTestDatabase import TorqueReactionTestDatabase
 
@@ -20,23 +21,9 @@ print(f"Added Trial with ID: {trial_id}")
 
 #CAN initialization
 node_id = 0
-bus = can.interface.Bus("can0", bustype="socketcan")
-
-while not (bus.recv(timeout=0) is None): pass
-bus.send(can.Message(arbitration_id=(node_id << 5 | 0x07), data=struct.pack('<I', 8), is_extended_id=False))
-
-start_time = time.time()
-timeout = 10  # seconds
-
-for msg in bus:
-    if time.time() - start_time > timeout:
-        print("Timeout waiting for the expected CAN message.")
-        break
-
-    if msg.arbitration_id == (node_id << 5 | 0x01):
-        error, state, result, traj_done = struct.unpack('<IBBB', bytes(msg.data[:7]))
-        if state == 8:
-            break
+#Every received frame goes through the dispatcher, threads subscribe to the IDs they need and
+#only those IDs pass the kernel CAN filters
+bus, dispatcher = open_odrive_bus("can0", [node_id])
 
 #Pause before proceeding
 print('Pause for 5 s...')
@@ -49,9 +36,10 @@ torque_setpoint = .35
 
 #setup threads
 threads = TorqueReactionTestThreads()
+threads.kernel_keepalive = False  # True: the socketcan broadcast manager repeats the torque setpoint
 
 set_motor_torque_thread = threading.Thread(target=threads.set_torque_thread, args=(node_id, bus, torque_setpoint, initialTime, running))
-get_torque_estimate = threading.Thread(target=threads.get_system_torque_thread, args=(node_id, bus, initialTime, running))
+get_torque_estimate = threading.Thread(target=threads.get_system_torque_thread, args=(node_id, dispatcher, initialTime, running))
 
 #Initiate threads
 print("\nTest Active")
@@ -73,6 +61,7 @@ finally:
     # Wait for the threads to stop
     set_motor_torque_thread.join()
     get_torque_estimate.join()
+    threads.report_loops()
 
     bus.send(can.Message(arbitration_id=(node_id << 5 | 0x0E), data=struct.pack('<f', 0.0), is_extended_id=False))
     print(f"Successfully set ODrive {node_id} to 0 [Nm]")
@@ -82,5 +71,6 @@ finally:
         print('adding to db')
 
     # Shutdown the bus in the finally block to ensure it's always executed
+    dispatcher.shutdown()
     bus.shutdown()
     print("\nProgram terminated gracefully.")
@@ -19,3 +19,8 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 '''
 
 from .as5048b import *
+from .bus import FakeBus, RecordingBus, ReplayBus, SimulatedBus, read_recording
+from .encoder_array import EncoderArray
+from .sampler import AS5048BSampler
+from .tracker import MultiTurnTracker
+from .convert import ticks_from_bytes, ticks_to_angle, bytes_to_angle
@@ -18,8 +18,63 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 '''
 
+from collections import namedtuple
+
 import numpy as np
-from smbus2 import SMBus
+
+from .bus import open_bus
+
+
+class AS5048BSample(namedtuple('AS5048BSample', ['agc', 'diagnostics', 'magnitude', 'position', 'angle'])):
+    """_summary_
+        Immutable sample of every AS5048B data register, decoded from a single burst read
+    """
+    __slots__ = ()
+
+    @property
+    def offset_compensation_finished(self):
+        """_summary_
+
+        Returns:
+            bool: True once the offset compensation algorithm has finished (OCF)
+        """
+        return bool(self.diagnostics & 0x01)
+
+    @property
+    def cordic_overflow(self):
+        """_summary_
+
+        Returns:
+            bool: True if the CORDIC overflowed and the angle is invalid (COF)
+        """
+        return bool(self.diagnostics & 0x02)
+
+    @property
+    def magnet_too_strong(self):
+        """_summary_
+
+        Returns:
+            bool: True if the magnetic field is too strong (Comp Low)
+        """
+        return bool(self.diagnostics & 0x04)
+
+    @property
+    def magnet_too_weak(self):
+        """_summary_
+
+        Returns:
+            bool: True if the magnetic field is too weak (Comp High)
+        """
+        return bool(self.diagnostics & 0x08)
+
+    @property
+    def valid(self):
+        """_summary_
+
+        Returns:
+            bool: True if the angle in this sample can be trusted
+        """
+        return self.offset_compensation_finished and not self.cordic_overflow
 
 
 class AS5048B:
@@ -31,7 +86,8 @@ class AS5048B:
 
         Args:
             address (_type_): _description_
-            bus (int, optional): _description_. Defaults to 1.
+            bus (int or bus object, optional): I2C bus number, or a bus object such as
+                FakeBus, RecordingBus, ReplayBus or SimulatedBus. Defaults to 1.
             invert (bool, optional): _description_. Defaults to False.
         """
 
@@ -55,13 +111,11 @@ class AS5048B:
         Angle MSB = 0xFF
         '''
 
-        self.bus = SMBus(bus)  # I2C Bus
+        self.bus = open_bus(bus)  # I2C Bus
         self.address = address  # Encoder I2C address
         self.invert = invert  # Invert encoder direction
         self.resolution = 2 ** 14  # Define "ticks", 14 bit encoder
-        self.position = self.read_position()  # Read position of encoder
-        self.angle = self.read_angle()
-        self.magnitude = self.read_magnitude()
+        self.read_all()  # Read AGC, diagnostics, magnitude and position in one transaction
 
 
     def get_position(self):
@@ -88,24 +142,72 @@ class AS5048B:
         """
         return self.magnitude  # Return encoder magnitude
 
+    def get_agc(self):
+        """_summary_
+
+        Returns:
+            int: Automatic gain control value from the last snapshot (0 to 255)
+        """
+        return self.agc  # Return encoder automatic gain control value
+
+    def get_diagnostics(self):
+        """_summary_
+
+        Returns:
+            int: Diagnostics register from the last snapshot
+        """
+        return self.diagnostics  # Return encoder diagnostics flags
+
+    def snapshot(self):
+        """_summary_
+
+        Returns:
+            AS5048BSample: Last sample read by read_all(), read_position(), read_angle() or read_magnitude(), no I2C transaction
+        """
+        return self.sample
+
+    def read_all(self):
+        """_summary_
+            Read AGC, diagnostics, magnitude and angle registers in one auto-increment block read
+
+        Returns:
+            AS5048BSample: Decoded sample of all data registers
+        """
+        data = self.bus.read_i2c_block_data(
+            self.address, 0xFA, 6
+        )  # Request data from registers 0xFA through 0xFF of the encoder
+        # Takes about as long as a single 2 byte read, instead of one read per register pair.
+        return self.decode(data)
+
+    def decode(self, data):
+        """_summary_
+            Decode a 6 byte block starting at register 0xFA and update the cached values
+
+        Args:
+            data (sequence of int): Bytes read from registers 0xFA through 0xFF
+
+        Returns:
+            AS5048BSample: Decoded sample of all data registers
+        """
+        position = (data[4] << 6) | (data[5] & 0x3F)  # 14 bit angle from 0xFE & 0xFF
+        if self.invert:
+            position = (self.resolution - position) % self.resolution  # If encoder is inverted, invert position
+        self.agc = data[0]
+        self.diagnostics = data[1]
+        self.magnitude = (data[2] << 6) | (data[3] & 0x3F)  # 14 bit magnitude from 0xFC & 0xFD
+        self.position = position
+        self.angle = position * ((2 * np.pi) / self.resolution)  # Scale values to get radians
+        self.sample = AS5048BSample(self.agc, self.diagnostics, self.magnitude, self.position, self.angle)
+        return self.sample
+
     def read_position(self):
         """_summary_
 
         Returns:
             _type_: _description_
         """
-        pos = self.bus.read_i2c_block_data(
-            self.address, 0xFE, 2
-        )  # Request data from registers 0xFE & 0xFF of the encoder
-        # Takes ~700 microseconds.
-        self.position = (pos[0] << 6) | pos[
-            1
-        ]  # Remove unused bits 6 & 7 from byte 0xFF creating 14 bit value
-        if self.invert:
-            self.position = (
-                self.resolution - self.position
-            )  # If encoder is inverted, invert position
-        return self.position  # Return Raw encoder position (0 to 16384)
+        # Same block read and decoding as read_all(), so both APIs agree on masking and inversion
+        return self.read_all().position  # Return Raw encoder position (0 to 16383)
 
     def read_angle(self):
         """_summary_
@@ -113,10 +215,7 @@ class AS5048B:
         Returns:
             _type_: _description_
         """
-        self.read_position()  # Read encoder position
-        self.angle = self.position * (
-            (2 * np.pi) / self.resolution
-        )  # Scale values to get radians
+        self.read_position()  # Read encoder position, decode() also scales it to radians
         return self.angle  # Return encoder angle in radians
 
     def read_magnitude(self):
@@ -125,11 +224,5 @@ class AS5048B:
         Returns:
             _type_: _description_
         """
-        magnitude = self.bus.read_i2c_block_data(
-            self.address, 0xFC, 2
-        )  # Request data from registers 0xFC & 0xFD of the encoder
-        # Takes ~700 microseconds.
-        self.magnitude = (magnitude[0] << 6) | magnitude[
-            1
-        ]  # Remove unused bits 6 & 7 from byte 0xFD creating 14 bit value
-        return self.magnitude  # Return encoder magnitude
+        # Same block read as read_all(), so snapshot() never holds an older magnitude
+        return self.read_all().magnitude  # Return encoder magnitude
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+
+'''
+This file is part of the as5048b library (https://github.com/ansarid/as5048b).
+Copyright (C) 2022  Daniyal Ansari
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import errno
+import math
+import random
+import struct
+import time
+from collections import deque
+from ctypes import memmove, string_at
+
+from smbus2 import SMBus
+from smbus2.smbus2 import I2C_M_RD
+
+
+RECORDING_MAGIC = b'AS5BUS\x00\x01'  # File signature and format version
+RECORD = struct.Struct('<qBBBB')  # t_ns since start, kind, address, register, length, then length data bytes
+READ = 0
+WRITE = 1
+
+
+def open_bus(bus):
+    """_summary_
+        Open an SMBus from a bus number, or pass an already constructed bus object through
+
+    Args:
+        bus (int or bus object): I2C bus number, or any object with the SMBus interface
+
+    Returns:
+        _type_: Bus object to issue transactions on
+    """
+    if isinstance(bus, int):
+        return SMBus(bus)
+    return bus
+
+
+class FakeBus:
+    """_summary_
+        Register level stand-in for smbus2.SMBus that emulates AS5048B encoders,
+        so acquisition code can run and be benchmarked without hardware
+    """
+    def __init__(self, latency=0.0):
+        """_summary_
+
+        Args:
+            latency (float, optional): Seconds to busy-wait per transaction to emulate the ioctl. Defaults to 0.0.
+        """
+        self.registers = {}  # I2C address -> 256 byte register file
+        self.latency = latency  # Emulated cost of one bus transaction
+        self.transactions = 0  # Number of transactions (ioctls) issued on this bus
+
+    def add_device(self, address, position=0, magnitude=4096, agc=128, diagnostics=0x01):
+        """_summary_
+
+        Args:
+            address (int): I2C address of the emulated encoder
+            position (int, optional): Raw encoder position (0 to 16383). Defaults to 0.
+            magnitude (int, optional): CORDIC magnitude (0 to 16383). Defaults to 4096.
+            agc (int, optional): Automatic gain control value. Defaults to 128.
+            diagnostics (int, optional): Diagnostics flags. Defaults to 0x01 (OCF set).
+        """
+        self.registers[address] = bytearray(256)
+        self.registers[address][0xFA] = agc
+        self.registers[address][0xFB] = diagnostics
+        self.set_magnitude(address, magnitude)
+        self.set_position(address, position)
+
+    def set_position(self, address, position):
+        """_summary_
+
+        Args:
+            address (int): I2C address of the emulated encoder
+            position (int): Raw encoder position, wrapped to 14 bits
+        """
+        position = int(position) & 0x3FFF
+        self.registers[address][0xFE] = position >> 6  # Angle (13:6)
+        self.registers[address][0xFF] = position & 0x3F  # Angle (5:0)
+
+    def set_magnitude(self, address, magnitude):
+        """_summary_
+
+        Args:
+            address (int): I2C address of the emulated encoder
+            magnitude (int): CORDIC magnitude, wrapped to 14 bits
+        """
+        magnitude = int(magnitude) & 0x3FFF
+        self.registers[address][0xFC] = magnitude >> 6  # Magnitude (13:6)
+        self.registers[address][0xFD] = magnitude & 0x3F  # Magnitude (5:0)
+
+    def refresh(self, address):
+        """_summary_
+            Hook called before every read of a device, subclasses update the registers here
+
+        Args:
+            address (int): I2C address about to be read
+        """
+
+    def _transaction(self):
+        self.transactions += 1
+        if self.latency:
+            deadline = time.perf_counter() + self.latency
+            while time.perf_counter() < deadline:
+                pass
+
+    def _device(self, address):
+        try:
+            return self.registers[address]
+        except KeyError:
+            raise OSError(errno.EREMOTEIO, 'Remote I/O error') from None  # Same error as a NACK on real hardware
+
+    def _read(self, address, register, length):
+        registers = self._device(address)
+        self.refresh(address)
+        return [registers[(register + i) & 0xFF] for i in range(length)]  # Register address auto-increments
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        self._transaction()
+        return self._read(i2c_addr, register, 1)[0]
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        self._transaction()
+        return self._read(i2c_addr, register, length)
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self._transaction()
+        self._device(i2c_addr)[register] = value & 0xFF
+
+    def i2c_rdwr(self, *i2c_msgs):
+        """_summary_
+            Serve a combined transaction, a write sets the register pointer and a read continues from it
+        """
+        self._transaction()
+        pointers = {}
+        for msg in i2c_msgs:
+            if msg.flags & I2C_M_RD:
+                data = bytes(self._read(msg.addr, pointers.get(msg.addr, 0), msg.len))
+                memmove(msg.buf, data, msg.len)
+                pointers[msg.addr] = (pointers.get(msg.addr, 0) + msg.len) & 0xFF
+            else:
+                data = string_at(msg.buf, msg.len)
+                registers = self._device(msg.addr)
+                pointers[msg.addr] = data[0]
+                for i, value in enumerate(data[1:]):
+                    registers[(data[0] + i) & 0xFF] = value
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RecordingBus:
+    """_summary_
+        Wraps a real bus and streams every transaction, with timestamps, to a compact binary file
+    """
+    def __init__(self, bus, path):
+        """_summary_
+
+        Args:
+            bus (int or bus object): I2C bus number or bus object to record
+            path (str): File the session is written to
+        """
+        self.bus = open_bus(bus)
+        self.file = open(path, 'wb')
+        self.file.write(RECORDING_MAGIC)
+        self.start_ns = time.monotonic_ns()
+        self.pointers = {}  # Register pointer per address inside combined transactions
+
+    def _record(self, kind, address, register, data):
+        data = bytes(data)
+        self.file.write(RECORD.pack(time.monotonic_ns() - self.start_ns, kind, address, register, len(data)))
+        self.file.write(data)
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        value = self.bus.read_byte_data(i2c_addr, register, force)
+        self._record(READ, i2c_addr, register, [value])
+        return value
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        data = self.bus.read_i2c_block_data(i2c_addr, register, length, force)
+        self._record(READ, i2c_addr, register, data)
+        return data
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self.bus.write_byte_data(i2c_addr, register, value, force)
+        self._record(WRITE, i2c_addr, register, [value])
+
+    def i2c_rdwr(self, *i2c_msgs):
+        self.bus.i2c_rdwr(*i2c_msgs)
+        for msg in i2c_msgs:
+            data = bytes(msg)
+            if msg.flags & I2C_M_RD:
+                register = self.pointers.get(msg.addr, 0)
+                self._record(READ, msg.addr, register, data)
+                self.pointers[msg.addr] = (register + msg.len) & 0xFF
+            else:
+                self._record(WRITE, msg.addr, data[0], data[1:])
+                self.pointers[msg.addr] = data[0]
+
+    def close(self):
+        self.file.close()
+        self.bus.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_recording(path):
+    """_summary_
+        Load a RecordingBus session
+
+    Args:
+        path (str): Recorded session file
+
+    Returns:
+        list: (t_ns, kind, address, register, data) tuples in recorded order
+    """
+    with open(path, 'rb') as f:
+        blob = f.read()
+    if not blob.startswith(RECORDING_MAGIC):
+        raise ValueError(f"{path} is not an AS5048B bus recording")
+
+    records = []
+    offset = len(RECORDING_MAGIC)
+    while offset < len(blob):
+        t_ns, kind, address, register, length = RECORD.unpack_from(blob, offset)
+        offset += RECORD.size
+        records.append((t_ns, kind, address, register, blob[offset:offset + length]))
+        offset += length
+    return records
+
+
+class ReplayBus:
+    """_summary_
+        Serves a RecordingBus session back, at recorded speed, scaled speed or as fast as possible
+    """
+    def __init__(self, path, speed=1.0, loop=False):
+        """_summary_
+
+        Args:
+            path (str): Recorded session file
+            speed (float, optional): Playback speed, 10.0 replays 10x faster, None disables pacing. Defaults to 1.0.
+            loop (bool, optional): Start over when the recording runs out. Defaults to False.
+        """
+        self.speed = speed
+        self.loop = loop
+        self.recording = [record for record in read_recording(path) if record[1] == READ]
+        self.start_ns = None  # Wall clock time that recording time 0 maps to
+        self.pointers = {}
+        self._load()
+
+    def _load(self):
+        # Reads are served per (address, register), so interleaving between encoders may change
+        self.reads = {}
+        for t_ns, kind, address, register, data in self.recording:
+            self.reads.setdefault((address, register), deque()).append((t_ns, data))
+        self.start_ns = None
+
+    def _read(self, address, register, length):
+        queue = self.reads.get((address, register))
+        if queue is None:
+            raise OSError(errno.EREMOTEIO, 'Remote I/O error')  # Never recorded, behave like a NACK
+        if not queue:
+            if not self.loop:
+                raise EOFError(f"recording has no more reads of 0x{address:02X} register 0x{register:02X}")
+            self._load()
+            queue = self.reads[(address, register)]
+
+        t_ns, data = queue.popleft()
+        if len(data) < length:
+            raise ValueError(f"recorded read of 0x{address:02X} register 0x{register:02X} has {len(data)} bytes, {length} requested")
+
+        if self.speed:
+            if self.start_ns is None:
+                self.start_ns = time.monotonic_ns() - int(t_ns / self.speed)
+            delay = (self.start_ns + t_ns / self.speed - time.monotonic_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)  # Hold the sample until its (scaled) recorded time
+        return data[:length]
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        return self._read(i2c_addr, register, 1)[0]
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        return list(self._read(i2c_addr, register, length))
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        pass  # Writes cannot change a recording
+
+    def i2c_rdwr(self, *i2c_msgs):
+        for msg in i2c_msgs:
+            if msg.flags & I2C_M_RD:
+                register = self.pointers.get(msg.addr, 0)
+                memmove(msg.buf, self._read(msg.addr, register, msg.len), msg.len)
+                self.pointers[msg.addr] = (register + msg.len) & 0xFF
+            else:
+                self.pointers[msg.addr] = string_at(msg.buf, 1)[0]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SimulatedBus(FakeBus):
+    """_summary_
+        FakeBus whose encoders measure a simulated damped pendulum
+    """
+    def __init__(self, addresses=(0x40,), theta=0.5, omega=0.0, length=0.3, damping=0.05, gear_ratio=1.0,
+                 offsets=None, noise=0.0, time_scale=1.0, latency=0.0, seed=None):
+        """_summary_
+
+        Args:
+            addresses (sequence of int, optional): Encoder addresses, all measuring the pendulum. Defaults to (0x40,).
+            theta (float, optional): Initial pendulum angle from hanging straight down, radians. Defaults to 0.5.
+            omega (float, optional): Initial angular velocity, rad/s. Defaults to 0.0.
+            length (float, optional): Pendulum length, meters. Defaults to 0.3.
+            damping (float, optional): Viscous damping, 1/s. Defaults to 0.05.
+            gear_ratio (float, optional): Encoder turns per pendulum turn. Defaults to 1.0.
+            offsets (sequence of int, optional): Zero offset of each encoder in ticks. Defaults to None.
+            noise (float, optional): Standard deviation of measurement noise in ticks. Defaults to 0.0.
+            time_scale (float, optional): Simulated seconds per wall clock second, None to advance only
+                with advance(). Defaults to 1.0.
+            latency (float, optional): Seconds to busy-wait per transaction. Defaults to 0.0.
+            seed (int, optional): Seed for the measurement noise. Defaults to None.
+        """
+        super().__init__(latency)
+        self.theta = theta
+        self.omega = omega
+        self.length = length
+        self.damping = damping
+        self.gear_ratio = gear_ratio
+        self.noise = noise
+        self.time_scale = time_scale
+        self.max_step = 0.005  # Longest RK4 step, simulated seconds (small against the ~1 s pendulum period)
+        self.sim_time = 0.0
+        self.start = time.monotonic()
+        self.random = random.Random(seed)
+
+        offsets = offsets if offsets is not None else [0] * len(addresses)
+        self.offsets = dict(zip(addresses, offsets))
+        for address in addresses:
+            self.add_device(address)
+
+    def advance(self, seconds):
+        """_summary_
+            Integrate the pendulum forward with RK4, in as few equal steps of at most
+            max_step as cover the interval. The cost depends on the simulated time,
+            not on how often the encoders are read, so 100x real time stays cheap.
+
+        Args:
+            seconds (float): Simulated time to advance
+        """
+        if seconds <= 0:
+            return
+        steps = math.ceil(seconds / self.max_step)
+        dt = seconds / steps
+        half = 0.5 * dt
+        g = 9.80665 / self.length
+        damping = self.damping
+        sin = math.sin
+        theta, omega = self.theta, self.omega
+        for _ in range(steps):
+            a1 = -g * sin(theta) - damping * omega
+            w2 = omega + half * a1
+            a2 = -g * sin(theta + half * omega) - damping * w2
+            w3 = omega + half * a2
+            a3 = -g * sin(theta + half * w2) - damping * w3
+            w4 = omega + dt * a3
+            a4 = -g * sin(theta + dt * w3) - damping * w4
+            theta += dt / 6 * (omega + 2 * w2 + 2 * w3 + w4)
+            omega += dt / 6 * (a1 + 2 * a2 + 2 * a3 + a4)
+        self.theta, self.omega = theta, omega
+        self.sim_time += seconds
+
+    def refresh(self, address):
+        if self.time_scale is not None:
+            self.advance((time.monotonic() - self.start) * self.time_scale - self.sim_time)
+
+        ticks = self.theta * self.gear_ratio * (2 ** 14) / (2 * math.pi) + self.offsets[address]
+        if self.noise:
+            ticks += self.random.gauss(0.0, self.noise)
+        self.set_position(address, int(round(ticks)) % (2 ** 14))
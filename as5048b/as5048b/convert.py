@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+'''
+This file is part of the as5048b library (https://github.com/ansarid/as5048b).
+Copyright (C) 2022  Daniyal Ansari
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+
+
+RESOLUTION = 2 ** 14  # Ticks per revolution of the 14 bit encoder
+
+FULL_TURN = {
+    'rad': 2 * np.pi,
+    'deg': 360.0,
+    'turns': 1.0,
+}
+
+
+def ticks_from_bytes(data):
+    """_summary_
+        Decode raw angle (or magnitude) register pairs into 14 bit ticks
+
+    Args:
+        data (bytes, bytearray or array_like): Register pairs as read from 0xFE & 0xFF
+            (or 0xFC & 0xFD), either flat [msb, lsb, msb, lsb, ...] or shaped (N, 2)
+
+    Returns:
+        numpy.ndarray: uint16 ticks (0 to 16383), one per register pair
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = np.frombuffer(data, dtype=np.uint8)
+    pairs = np.asarray(data, dtype=np.uint8).reshape(-1, 2)
+    ticks = pairs[:, 0].astype(np.uint16)
+    ticks <<= 6  # Register 0xFE holds bits 13:6
+    ticks |= pairs[:, 1] & 0x3F  # Register 0xFF holds bits 5:0, bits 6 & 7 are unused
+    return ticks
+
+
+def ticks_to_angle(ticks, units='rad', offset=0.0, invert=False, gear_ratio=1.0, wrap=True,
+                   resolution=RESOLUTION, out=None):
+    """_summary_
+        Convert raw ticks to angles in one vectorized pass
+
+        Applied in order: inversion, scaling to units, gear ratio, zero offset, wrap.
+
+    Args:
+        ticks (array_like): Raw encoder positions (0 to resolution - 1), any shape
+        units (str, optional): 'rad', 'deg' or 'turns'. Defaults to 'rad'.
+        offset (float, optional): Zero offset subtracted from the output angle, in units. Defaults to 0.0.
+        invert (bool, optional): Invert encoder direction. Defaults to False.
+        gear_ratio (float, optional): Encoder turns per output turn. Defaults to 1.0.
+        wrap (bool, optional): Wrap the result into [0, full turn). Defaults to True.
+        resolution (int, optional): Ticks per encoder revolution. Defaults to 2 ** 14.
+        out (numpy.ndarray, optional): float64 array to write into instead of allocating. Defaults to None.
+
+    Returns:
+        numpy.ndarray: float64 angles with the same shape as ticks
+    """
+    try:
+        full_turn = FULL_TURN[units]
+    except KeyError:
+        raise ValueError(f"units must be one of {sorted(FULL_TURN)}, got {units!r}") from None
+
+    ticks = np.asarray(ticks)
+    if out is None:
+        out = np.empty(ticks.shape, dtype=np.float64)
+    np.copyto(out, ticks, casting='unsafe')
+
+    if invert:
+        np.subtract(resolution, out, out=out)
+        np.remainder(out, resolution, out=out)  # Tick 0 stays 0, same as AS5048B.decode
+    out *= full_turn / (resolution * gear_ratio)
+    if offset:
+        out -= offset
+    if wrap:
+        np.mod(out, full_turn, out=out)
+    return out
+
+
+def bytes_to_angle(data, **kwargs):
+    """_summary_
+        Decode raw register pairs and convert them to angles, see ticks_to_angle for kwargs
+
+    Args:
+        data (bytes, bytearray or array_like): Register pairs as read from 0xFE & 0xFF
+
+    Returns:
+        numpy.ndarray: float64 angles, one per register pair
+    """
+    return ticks_to_angle(ticks_from_bytes(data), **kwargs)
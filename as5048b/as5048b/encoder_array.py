@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+'''
+This file is part of the as5048b library (https://github.com/ansarid/as5048b).
+Copyright (C) 2022  Daniyal Ansari
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import time
+from ctypes import POINTER, addressof, c_char, c_uint8, cast
+
+import numpy as np
+from smbus2 import i2c_msg
+from smbus2.smbus2 import I2C_M_RD
+
+from .bus import open_bus
+
+
+class EncoderArray:
+    """_summary_
+        Several AS5048B encoders on one bus, read together in a single i2c_rdwr transaction
+    """
+    max_encoders = 21  # The kernel accepts at most 42 messages per I2C_RDWR ioctl
+
+    def __init__(self, addresses, bus=1, invert=False):
+        """_summary_
+
+        Args:
+            addresses (sequence of int): I2C addresses of the encoders, in output order
+            bus (int or bus object, optional): I2C bus number or bus object. Defaults to 1.
+            invert (bool or sequence of bool, optional): Invert all encoders, or each one. Defaults to False.
+        """
+        self.addresses = tuple(addresses)
+        if not 0 < len(self.addresses) <= self.max_encoders:
+            raise ValueError(f"EncoderArray supports 1 to {self.max_encoders} encoders, got {len(self.addresses)}")
+
+        self.bus = open_bus(bus)  # I2C Bus
+        self.resolution = 2 ** 14  # Define "ticks", 14 bit encoder
+        self.invert = np.broadcast_to(np.asarray(invert, dtype=bool), (len(self.addresses),)).copy()
+
+        # One contiguous receive buffer, every read message lands in its own 2 byte slice
+        self._raw = (c_uint8 * (2 * len(self.addresses)))()
+        self._raw_view = np.frombuffer(self._raw, dtype=np.uint8).reshape(-1, 2)
+        self._messages = []
+        for i, address in enumerate(self.addresses):
+            self._messages.append(i2c_msg.write(address, [0xFE]))  # Point at angle register 0xFE
+            self._messages.append(i2c_msg(
+                addr=address, flags=I2C_M_RD, len=2,
+                buf=cast(addressof(self._raw) + 2 * i, POINTER(c_char))
+            ))  # Read 0xFE & 0xFF into the shared buffer
+
+        self.positions = np.zeros(len(self.addresses), dtype=np.uint16)
+        self.angles = np.zeros(len(self.addresses), dtype=np.float64)
+        self.timestamp = 0  # time.monotonic_ns() at the middle of the last transaction
+
+    def read_positions(self):
+        """_summary_
+            Read the angle registers of every encoder with one ioctl
+
+        Returns:
+            tuple: (positions, timestamp), raw positions as a uint16 array (0 to 16383)
+            and the shared time.monotonic_ns() timestamp. The array is reused by the next read.
+        """
+        start = time.monotonic_ns()
+        self.bus.i2c_rdwr(*self._messages)
+        end = time.monotonic_ns()
+        self.timestamp = (start + end) // 2
+
+        high = self._raw_view[:, 0].astype(np.uint16)
+        np.bitwise_or(high << 6, self._raw_view[:, 1] & 0x3F, out=self.positions)  # 14 bit positions
+        if self.invert.any():
+            inverted = (self.resolution - self.positions[self.invert]) % self.resolution
+            self.positions[self.invert] = inverted  # If encoder is inverted, invert position
+        return self.positions, self.timestamp
+
+    def read_angles(self):
+        """_summary_
+
+        Returns:
+            tuple: (angles, timestamp), encoder angles in radians and the shared timestamp.
+            The array is reused by the next read.
+        """
+        self.read_positions()
+        np.multiply(self.positions, (2 * np.pi) / self.resolution, out=self.angles)  # Scale values to get radians
+        return self.angles, self.timestamp
+
+    def close(self):
+        self.bus.close()
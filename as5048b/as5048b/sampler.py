@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+'''
+This file is part of the as5048b library (https://github.com/ansarid/as5048b).
+Copyright (C) 2022  Daniyal Ansari
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import threading
+import time
+from ctypes import POINTER, c_char, c_uint8, cast
+
+import numpy as np
+from smbus2 import i2c_msg
+from smbus2.smbus2 import I2C_M_RD
+
+
+sample_dtype = np.dtype([('t_ns', np.int64), ('raw_ticks', np.uint16), ('magnitude', np.uint16)])
+
+
+class AS5048BSampler:
+    """_summary_
+        Background acquisition thread that samples an AS5048B at a fixed rate into a preallocated ring buffer
+    """
+    def __init__(self, encoder, rate=1000.0, capacity=4096):
+        """_summary_
+
+        Args:
+            encoder (AS5048B): Encoder to sample, its bus, address and invert setting are used
+            rate (float, optional): Sampling rate in Hz. Defaults to 1000.0.
+            capacity (int, optional): Number of samples kept in the ring buffer. Defaults to 4096.
+        """
+        self.encoder = encoder
+        self.period_ns = int(round(1e9 / rate))
+        self.capacity = capacity
+
+        # The ring is stored twice back to back, so any window of up to capacity
+        # samples is one contiguous slice and window() never has to copy.
+        self._ring = np.zeros(2 * capacity, dtype=sample_dtype)
+        self._t_ns = self._ring['t_ns']
+        self._raw_ticks = self._ring['raw_ticks']
+        self._magnitude = self._ring['magnitude']
+        self.count = 0  # Total samples published, written last so readers never see a partial sample
+
+        self.overruns = 0  # Deadlines missed because a read took longer than the period
+        self.errors = 0  # Failed bus transactions
+
+        # Preallocated combined transaction: point at 0xFC, read magnitude and angle (0xFC to 0xFF)
+        self._rx = (c_uint8 * 4)()
+        self._messages = (
+            i2c_msg.write(encoder.address, [0xFC]),
+            i2c_msg(addr=encoder.address, flags=I2C_M_RD, len=4, buf=cast(self._rx, POINTER(c_char))),
+        )
+
+        self._running = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """_summary_
+            Start the acquisition thread
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name='AS5048BSampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """_summary_
+            Stop the acquisition thread and wait for it to exit
+        """
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        bus = self.encoder.bus
+        messages = self._messages
+        rx = self._rx
+        resolution = self.encoder.resolution
+        invert = self.encoder.invert
+        capacity = self.capacity
+        period_ns = self.period_ns
+
+        deadline = time.monotonic_ns()
+        while self._running.is_set():
+            try:
+                bus.i2c_rdwr(*messages)
+            except OSError:
+                self.errors += 1
+            else:
+                t_ns = time.monotonic_ns()
+                raw_ticks = (rx[2] << 6) | (rx[3] & 0x3F)  # 14 bit angle from 0xFE & 0xFF
+                if invert:
+                    raw_ticks = (resolution - raw_ticks) % resolution
+                index = self.count % capacity
+                for i in (index, index + capacity):
+                    self._t_ns[i] = t_ns
+                    self._raw_ticks[i] = raw_ticks
+                    self._magnitude[i] = (rx[0] << 6) | (rx[1] & 0x3F)  # 14 bit magnitude from 0xFC & 0xFD
+                self.count += 1
+
+            # Sleep until the next absolute deadline, skipping any that were missed
+            deadline += period_ns
+            now = time.monotonic_ns()
+            if now >= deadline:
+                missed = (now - deadline) // period_ns + 1
+                self.overruns += missed
+                deadline += missed * period_ns
+            time.sleep((deadline - now) / 1e9)
+
+    def latest(self):
+        """_summary_
+            Most recent sample, without locking or waiting on the acquisition thread
+
+        Returns:
+            tuple: (t_ns, raw_ticks, magnitude) or None if nothing has been sampled yet
+        """
+        count = self.count
+        if count == 0:
+            return None
+        index = (count - 1) % self.capacity
+        return int(self._t_ns[index]), int(self._raw_ticks[index]), int(self._magnitude[index])
+
+    def window(self, n=None):
+        """_summary_
+            Zero-copy view of the most recent samples, oldest first
+
+        Args:
+            n (int, optional): Number of samples, at most capacity. Defaults to all available.
+
+        Returns:
+            numpy.ndarray: Structured view with fields t_ns, raw_ticks and magnitude. The
+            acquisition thread keeps writing into the ring, copy the view to keep it.
+        """
+        count = self.count
+        available = min(count, self.capacity)
+        n = available if n is None else min(n, available)
+        end = count % self.capacity + self.capacity
+        return self._ring[end - n:end]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+'''
+This file is part of the as5048b library (https://github.com/ansarid/as5048b).
+Copyright (C) 2022  Daniyal Ansari
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import math
+
+
+class MultiTurnTracker:
+    """_summary_
+        Streaming multi-turn unwrapper and tracking observer for AS5048B positions.
+
+        Raw 14 bit positions are unwrapped in integer ticks (no floating point drift
+        over many turns) and fed to a third order tracking loop (PLL style
+        alpha-beta-gamma observer) that estimates continuous position, velocity and
+        acceleration. Every update is O(1).
+
+        The gains are discretized for each sample interval dt so that the loop has a
+        triple pole at z = exp(-bandwidth * dt). That pole is inside the unit circle
+        for any bandwidth and dt, so there is no stability limit on bandwidth * dt;
+        above about 1 the observer simply follows the raw measurement closely.
+    """
+    __slots__ = (
+        'resolution', 'scale', 'bandwidth', 'gain_dt', 'alpha', 'beta', 'gamma',
+        'last_ticks', 'last_time', 'continuous_ticks', 'turns',
+        'position', 'velocity', 'acceleration',
+    )
+
+    def __init__(self, bandwidth=100.0, resolution=2 ** 14, gear_ratio=1.0):
+        """_summary_
+
+        Args:
+            bandwidth (float, optional): Observer bandwidth in rad/s, higher tracks faster but passes more noise. Defaults to 100.0.
+            resolution (int, optional): Ticks per encoder revolution. Defaults to 2 ** 14.
+            gear_ratio (float, optional): Encoder turns per output turn, estimates are reported at the output. Defaults to 1.0.
+        """
+        self.resolution = resolution
+        self.scale = (2 * math.pi) / (resolution * gear_ratio)  # Ticks to output radians
+
+        if bandwidth <= 0:
+            raise ValueError("bandwidth must be positive")
+        self.bandwidth = bandwidth
+        self.gain_dt = None  # Sample interval the gains were computed for
+
+        self.reset()
+
+    def reset(self):
+        """_summary_
+            Forget all state, the next update re-initializes the tracker
+        """
+        self.last_ticks = None
+        self.last_time = None
+        self.continuous_ticks = 0  # Unwrapped position in ticks
+        self.turns = 0  # Whole encoder revolutions since the first sample
+        self.position = 0.0  # Radians
+        self.velocity = 0.0  # Radians per second
+        self.acceleration = 0.0  # Radians per second squared
+
+    def unwrap(self, raw_ticks):
+        """_summary_
+            Unwrap a raw position without running the observer
+
+        Args:
+            raw_ticks (int): Raw encoder position (0 to resolution - 1)
+
+        Returns:
+            int: Continuous position in ticks
+        """
+        if self.last_ticks is None:
+            self.continuous_ticks = raw_ticks
+        else:
+            half = self.resolution // 2
+            # Shortest signed step between samples, so crossing zero in either direction counts correctly
+            self.continuous_ticks += (raw_ticks - self.last_ticks + half) % self.resolution - half
+        self.last_ticks = raw_ticks
+        self.turns = self.continuous_ticks // self.resolution
+        return self.continuous_ticks
+
+    def set_gains(self, dt):
+        """_summary_
+            Alpha-beta-gamma gains placing a triple pole at r = exp(-bandwidth * dt).
+            Matches the characteristic polynomial (z - r)^3, and tends to the
+            continuous gains 3 bw, 3 bw^2 dt, bw^3 dt for bandwidth * dt << 1
+
+        Args:
+            dt (float): Sample interval in seconds
+        """
+        r = math.exp(-self.bandwidth * dt)
+        self.alpha = 1 - r ** 3
+        self.beta = 1.5 * (1 - r - r * r + r ** 3) / dt
+        self.gamma = (1 - r) ** 3 / (dt * dt)
+        self.gain_dt = dt
+
+    def update(self, raw_ticks, timestamp):
+        """_summary_
+
+        Args:
+            raw_ticks (int): Raw encoder position (0 to resolution - 1)
+            timestamp (float): Sample time in seconds, from a monotonic clock
+
+        Returns:
+            tuple: (position, velocity, acceleration) in rad, rad/s and rad/s^2
+        """
+        first = self.last_ticks is None
+        measured = self.unwrap(raw_ticks) * self.scale
+
+        if first:
+            self.position = measured
+            self.last_time = timestamp
+            return self.position, self.velocity, self.acceleration
+
+        dt = timestamp - self.last_time
+        if dt <= 0:
+            return self.position, self.velocity, self.acceleration  # Duplicate sample, nothing to propagate
+        self.last_time = timestamp
+
+        # Predict
+        self.position += dt * (self.velocity + 0.5 * dt * self.acceleration)
+        self.velocity += dt * self.acceleration
+
+        if dt != self.gain_dt:
+            self.set_gains(dt)
+
+        # Correct with the position residual
+        error = measured - self.position
+        self.position += self.alpha * error
+        self.velocity += self.beta * error
+        self.acceleration += self.gamma * error
+
+        return self.position, self.velocity, self.acceleration
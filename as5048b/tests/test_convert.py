@@ -0,0 +1,26 @@
+import math
+
+import numpy as np
+import pytest
+
+from as5048b import FakeBus
+from as5048b.as5048b import AS5048B
+from as5048b.convert import ticks_to_angle
+
+
+@pytest.mark.parametrize('units, full_turn', [('rad', 2 * math.pi), ('deg', 360.0), ('turns', 1.0)])
+def test_inverted_tick_zero_is_zero_without_wrap(units, full_turn):
+    #Without the modulo, inverted tick 0 came out as a full turn
+    angles = ticks_to_angle([0, 1, 2 ** 14 - 1], units=units, invert=True, wrap=False)
+    assert angles.tolist() == pytest.approx([0.0, full_turn * (2 ** 14 - 1) / 2 ** 14, full_turn / 2 ** 14])
+
+
+def test_inverted_angles_match_decode():
+    bus = FakeBus()
+    bus.add_device(0x40)
+    encoder = AS5048B(0x40, bus=bus, invert=True)
+    ticks = np.array([0, 1, 8192, 2 ** 14 - 1])
+    angles = ticks_to_angle(ticks, invert=True, wrap=False)
+    for tick, angle in zip(ticks, angles):
+        bus.set_position(0x40, int(tick))
+        assert encoder.read_all().angle == pytest.approx(angle)
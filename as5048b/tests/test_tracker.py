@@ -0,0 +1,41 @@
+import math
+
+import pytest
+
+from as5048b.tracker import MultiTurnTracker
+
+
+def run(tracker, speed, dt, duration, resolution=2 ** 14):
+    #Feed the raw ticks of a shaft turning at a constant speed [rad/s], return the last estimate
+    estimate = None
+    for k in range(int(duration / dt)):
+        t = k * dt
+        ticks = int(speed * t / (2 * math.pi) * resolution) % resolution
+        estimate = tracker.update(ticks, t)
+    return estimate, speed * (int(duration / dt) - 1) * dt
+
+
+@pytest.mark.parametrize('bandwidth', [100.0, 1000.0, 1e5])
+def test_tracks_constant_speed_at_high_bandwidth(bandwidth):
+    #bandwidth * dt of 1 and above diverged with the forward Euler gains
+    tracker = MultiTurnTracker(bandwidth=bandwidth)
+    (position, velocity, acceleration), expected = run(tracker, speed=20.0, dt=0.001, duration=2.0)
+
+    assert all(math.isfinite(value) for value in (position, velocity, acceleration))
+    assert position == pytest.approx(expected, abs=0.01)
+    assert velocity == pytest.approx(20.0, rel=0.05)
+    assert tracker.turns == int(expected / (2 * math.pi))
+
+
+def test_irregular_sample_intervals_stay_stable():
+    tracker = MultiTurnTracker(bandwidth=2000.0)
+    t = 0.0
+    for k in range(2000):
+        t += 0.0005 if k % 3 else 0.004
+        estimate = tracker.update(int(-15.0 * t / (2 * math.pi) * 2 ** 14) % 2 ** 14, t)
+    assert estimate[1] == pytest.approx(-15.0, rel=0.05)
+
+
+def test_rejects_non_positive_bandwidth():
+    with pytest.raises(ValueError):
+        MultiTurnTracker(bandwidth=0.0)